@@ -0,0 +1,135 @@
+import argparse
+import math
+import os
+import random
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from time import perf_counter
+
+import numpy as np
+
+import levelcache
+from simulation import Simulation
+import bench
+
+# Many independent simulations stepped across a process pool.
+# Each job loads a level, steps it headless with scripted laser shots and reports
+# when the goal was touched and how many shots were used. The final pose of every
+# dynamic level object is written into one shared memory array by the worker,
+# so only the small summary is pickled back.
+#
+#   python batch.py Level_Test.tmx --jobs 64 --workers 8
+
+class Job:
+    def __init__(self, filename, shots=(), steps=1200, rate=60, seed=0, stop_at_goal=True, solver_iterations=None):
+        self.filename = filename
+        self.shots = list(shots)  # (tick, world target) laser shots
+        self.steps = steps
+        self.rate = rate
+        self.seed = seed  # seeds the simulation, see contact.seed
+        self.stop_at_goal = stop_at_goal
+        self.solver_iterations = solver_iterations
+
+
+def dynamic_objects(objects):
+    # the objects whose final pose is reported, in level order
+    return [o for o in objects if o.mass != math.inf]
+
+def play(sim, job):
+    # step sim through job; returns the tick the goal was first touched, or None
+    script = defaultdict(list)
+    for tick, target in job.shots:
+        script[tick].append(target)
+    goal_tick = None
+    for i in range(job.steps):
+        for target in script.get(sim.tick, ()):
+            sim.shoot(target)
+        sim.step(sim.stepper.dt)
+        if goal_tick is None and sim.touch_goal:
+            goal_tick = sim.tick
+            if job.stop_at_goal:
+                break
+    return goal_tick
+
+def run_job(index, job, memory, shape):
+    # worker side: run one job and write its poses into row index of the shared array
+    compiled = levelcache.load(job.filename)
+    sim = Simulation(compiled.objects, rate=job.rate, solver_iterations=job.solver_iterations, static=compiled.static, seed=job.seed)
+    start = perf_counter()
+    goal_tick = play(sim, job)
+    seconds = perf_counter() - start
+    shm = shared_memory.SharedMemory(name=memory)
+    try:
+        poses = np.ndarray(shape, dtype=float, buffer=shm.buf)
+        for j, o in enumerate(dynamic_objects(sim.objects)):
+            poses[index, j] = (o.pos.x, o.pos.y, o.angle)
+    finally:
+        shm.close()
+    return {
+        "job": index,
+        "steps": sim.tick,
+        "seconds": seconds,
+        "touch_goal": sim.touch_goal,
+        "goal_tick": goal_tick,
+        "time_to_goal": goal_tick * sim.stepper.dt if goal_tick is not None else None,
+        "bombs_used": sim.bombs_used,
+    }
+
+def run(jobs, workers=None):
+    # run every job across a pool of worker processes; results are in job order
+    # and each has a "poses" array of (x, y, angle) for the level's dynamic objects
+    counts = {}
+    for job in jobs:
+        if job.filename not in counts:
+            # also compiles the level once here rather than in every worker
+            counts[job.filename] = len(dynamic_objects(levelcache.load(job.filename).objects))
+    shape = (len(jobs), max(counts.values(), default=0), 3)
+    size = max(1, int(np.prod(shape)) * np.dtype(float).itemsize)
+    shm = shared_memory.SharedMemory(create=True, size=size)
+    try:
+        poses = np.ndarray(shape, dtype=float, buffer=shm.buf)
+        poses[:] = np.nan
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(run_job, i, job, shm.name, shape) for i, job in enumerate(jobs)]
+            results = [future.result() for future in futures]
+        for result, job in zip(results, jobs):
+            result["poses"] = poses[result["job"], :counts[job.filename]].copy()
+        del poses
+    finally:
+        shm.close()
+        shm.unlink()
+    return results
+
+def aiming_jobs(filename, n, steps, rate, spread=200):
+    # n variations of bench.level_shots with targets jittered per job
+    jobs = []
+    for seed in range(n):
+        rng = random.Random(seed)
+        shots = [(tick, (x + rng.uniform(-spread, spread), y)) for tick, (x, y) in bench.level_shots if tick < steps]
+        jobs.append(Job(filename, shots, steps=steps, rate=rate, seed=seed))
+    return jobs
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run many headless simulations across processes")
+    parser.add_argument("level", nargs="?", default="Level_Test.tmx")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count())
+    parser.add_argument("--workers", type=int, help="worker processes (default: one per core)")
+    parser.add_argument("--steps", type=int, default=1200)
+    parser.add_argument("--rate", type=int, default=60)
+    args = parser.parse_args(argv)
+
+    jobs = aiming_jobs(args.level, args.jobs, args.steps, args.rate)
+    start = perf_counter()
+    results = run(jobs, args.workers)
+    seconds = perf_counter() - start
+    steps = sum(result["steps"] for result in results)
+    print(f"{len(results)} jobs, {steps} steps in {seconds:.2f} s, {steps / seconds:.0f} steps/s")
+    for result in results:
+        goal = f"goal at {result['time_to_goal']:.2f} s" if result["touch_goal"] else "no goal"
+        print(f"    job {result['job']:3}: {goal}, {result['bombs_used']} bombs, {result['steps']} steps")
+    return results
+
+if __name__ == "__main__":
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    main()
@@ -0,0 +1,132 @@
+import argparse
+import json
+import math
+import os
+from collections import defaultdict
+from time import perf_counter
+
+from simulation import Simulation
+from profiler import Profiler
+import scenes
+
+# Headless benchmark harness.
+# Loads a level or a synthetic scene, runs a fixed number of physics steps with
+# scripted laser shots and reports steps/sec, contacts/sec and time per phase.
+#
+#   python bench.py                    # every scene
+#   python bench.py level --steps 1200
+#   python bench.py circles stack --json results.json
+#   python bench.py --check            # verify no body leaves any scene and a dropped box comes to rest,
+#                                      # exit status = failures (give scene names to check only those)
+
+# laser shots for the test level as (tick, world target): blast the player upwards
+level_shots = [(tick, (300, 1000)) for tick in range(30, 100000, 60)]
+
+def run(sim, steps, shots=()):
+    # step sim headless, one profiler frame per step
+    script = defaultdict(list)
+    for tick, target in shots:
+        script[tick].append(target)
+    dt = sim.stepper.dt
+    profiler = sim.profiler
+    contacts = sim.contact_count
+    start = perf_counter()
+    for i in range(steps):
+        profiler.begin_frame()
+        for target in script.get(sim.tick, ()):
+            sim.shoot(target)
+        sim.step(dt)
+        profiler.end_frame()
+    seconds = perf_counter() - start
+    contacts = sim.contact_count - contacts
+    summary = profiler.summary()
+    return {
+        "steps": steps,
+        "bodies": len(sim.bodies),
+        "seconds": seconds,
+        "steps_per_sec": steps / seconds if seconds else 0,
+        "contacts": contacts,
+        "contacts_per_sec": contacts / seconds if seconds else 0,
+        "step_p50_ms": summary["p50_ms"],
+        "step_p99_ms": summary["p99_ms"],
+        "phase_ms": summary["scope_ms"],
+        "counters_per_step": summary["counters"],
+    }
+
+def run_scene(name, steps, rate=120, substeps=1, iterations=None, sleeping=True):
+    sim = Simulation(scenes.scenes[name](), rate=rate, substeps=substeps, solver_iterations=iterations, sleeping=sleeping,
+                     profiler=Profiler(enabled=True, record=False))
+    shots = level_shots if sim.player is not None else ()
+    return run(sim, steps, shots)
+
+def escaped(sim):
+    # dynamic bodies that left the level: below or beside the bounds of the static
+    # objects, or with their center inside one of them (sunk through the floor)
+    static = [o for o in sim.objects if o.mass == math.inf and o.resolve and o not in sim.sensors
+              and all(map(math.isfinite, o.aabb()))]
+    boxes = [o.aabb() for o in static]
+    left, right = min(b[0] for b in boxes), max(b[2] for b in boxes)
+    bottom = max(b[3] for b in boxes)
+    bodies = sim.debris if sim.player is None else [sim.player] + sim.debris
+    return [o for o in bodies if not left <= o.pos.x <= right or o.pos.y > bottom
+            or any(s.distance(o.pos) == 0 for s in static)]
+
+def check(names=None, steps=240):
+    # run every scene with and without the contact solver and check that no body
+    # leaves the level, and that a dropped box ends up resting on the floor.
+    # Returns the number of failures
+    failed = 0
+    for name in names or scenes.scenes:
+        for iterations in (None, 8):
+            sim = Simulation(scenes.scenes[name](), solver_iterations=iterations)
+            try:
+                run(sim, steps, level_shots if sim.player is not None else ())
+                lost = escaped(sim)
+                ok = not lost
+                problem = f"{len(lost)} of {len(sim.bodies)} bodies left the level"
+                if ok and name == "drop":
+                    box = sim.debris[0]
+                    ok = abs(box.pos.y - 395) < 2 and box.vel.length() < 5
+                    problem = f"box at {box.pos}, moving at {box.vel}"
+            except Exception as e:
+                ok, problem = False, f"{type(e).__name__}: {e}"
+            failed += not ok
+            path = f"solver ({iterations} iterations)" if iterations else "default"
+            print(f"{name}, {path}: {'ok' if ok else 'FAILED, ' + problem}")
+    return failed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless physics benchmark")
+    parser.add_argument("scenes", nargs="*", help=f"any of {', '.join(scenes.scenes)} (default: all)")
+    parser.add_argument("--steps", type=int, default=300)
+    parser.add_argument("--rate", type=int, default=120)
+    parser.add_argument("--substeps", type=int, default=1)
+    parser.add_argument("--iterations", type=int, help="use the warm started contact solver with this many iterations")
+    parser.add_argument("--no-sleep", dest="sleeping", action="store_false", help="keep resting bodies awake")
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--check", action="store_true", help="only check that bodies stay in the scenes and exit")
+    args = parser.parse_args(argv)
+    for name in args.scenes:
+        if name not in scenes.scenes:
+            parser.error(f"unknown scene {name!r}")
+    if args.check:
+        raise SystemExit(check(args.scenes))
+
+    results = {}
+    for name in args.scenes or scenes.scenes:
+        results[name] = result = run_scene(name, args.steps, args.rate, args.substeps, args.iterations, args.sleeping)
+        print(f"{name}: {result['bodies']} bodies, {result['steps_per_sec']:.1f} steps/s, "
+              f"{result['contacts_per_sec']:.0f} contacts/s, "
+              f"p50 {result['step_p50_ms']:.3f} ms, p99 {result['step_p99_ms']:.3f} ms")
+        for phase, ms in result["phase_ms"].items():
+            print(f"    {phase:16} {ms:8.3f} ms/step")
+        for counter, n in result["counters_per_step"].items():
+            print(f"    {counter:16} {n:8.1f} /step")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    return results
+
+if __name__ == "__main__":
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    main()
@@ -0,0 +1,145 @@
+import math
+from collections import defaultdict
+
+# Broad phase collision culling.
+# Objects are hashed into a uniform grid by their axis aligned bounding box (aabb),
+# so the narrow phase in contact.py only runs on pairs whose boxes overlap.
+
+def overlaps(a, b):
+    # a and b are (min x, min y, max x, max y) boxes
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+def fatten(box, margin):
+    return (box[0] - margin, box[1] - margin, box[2] + margin, box[3] + margin)
+
+def contains(outer, inner):
+    return (outer[0] <= inner[0] and outer[1] <= inner[1]
+            and inner[2] <= outer[2] and inner[3] <= outer[3])
+
+
+class SpatialHash:
+    def __init__(self, cell_size=100, margin=4):
+        self.cell_size = cell_size
+        self.margin = margin  # cached boxes are fattened so small moves don't rehash
+        self.cells = defaultdict(list)  # (i, j) -> objects touching that cell
+        self.bounds = {}  # object -> cached fat aabb
+        self.keys = {}  # object -> cells the object is stored in
+        self.order = {}  # object -> insertion number, keeps query results in a stable order
+        self.unbounded = []  # objects with infinite bounds (walls) are candidates for everything
+        self.count = 0
+
+    def __len__(self):
+        return len(self.bounds)
+
+    def __contains__(self, obj):
+        return obj in self.bounds
+
+    def cell_range(self, box):
+        size = self.cell_size
+        return (math.floor(box[0] / size), math.floor(box[1] / size),
+                math.floor(box[2] / size), math.floor(box[3] / size))
+
+    def insert(self, obj):
+        if obj in self.bounds:
+            self.remove(obj)
+        box = obj.aabb()
+        self.order[obj] = self.count
+        self.count += 1
+        if not all(map(math.isfinite, box)):
+            self.bounds[obj] = box
+            self.keys[obj] = []
+            self.unbounded.append(obj)
+            return
+        box = fatten(box, self.margin)
+        i0, j0, i1, j1 = self.cell_range(box)
+        keys = [(i, j) for i in range(i0, i1 + 1) for j in range(j0, j1 + 1)]
+        for key in keys:
+            self.cells[key].append(obj)
+        self.bounds[obj] = box
+        self.keys[obj] = keys
+
+    def remove(self, obj):
+        if obj not in self.bounds:
+            return
+        for key in self.keys.pop(obj):
+            cell = self.cells[key]
+            cell.remove(obj)
+            if not cell:
+                del self.cells[key]
+        if obj in self.unbounded:
+            self.unbounded.remove(obj)
+        del self.bounds[obj]
+        del self.order[obj]
+
+    def update(self, obj):
+        # only rehash when the object has left its cached fat box
+        box = obj.aabb()
+        cached = self.bounds.get(obj)
+        if cached is not None and contains(cached, box):
+            return
+        order = self.order.get(obj)
+        self.insert(obj)
+        if order is not None:
+            self.order[obj] = order
+
+    def query(self, box, exclude=None):
+        # returns every object whose cached box overlaps box, in insertion order
+        found = set(self.unbounded)
+        i0, j0, i1, j1 = self.cell_range(box)
+        cells = self.cells
+        for i in range(i0, i1 + 1):
+            for j in range(j0, j1 + 1):
+                cell = cells.get((i, j))
+                if cell:
+                    found.update(cell)
+        found.discard(exclude)
+        bounds = self.bounds
+        result = [o for o in found if overlaps(bounds[o], box)]
+        result.sort(key=self.order.__getitem__)
+        return result
+
+    def candidates(self, obj):
+        # every stored object that might touch obj; obj does not need to be stored
+        return self.query(obj.aabb(), exclude=obj)
+
+    def within(self, point, radius, exclude=None):
+        # every stored object closer than radius to point
+        x, y = point
+        box = (x - radius, y - radius, x + radius, y + radius)
+        return [o for o in self.query(box, exclude=exclude) if o.distance(point) < radius]
+
+    def pairs(self, among=None):
+        # all candidate pairs of stored objects, each pair reported once.
+        # With among, only pairs that include at least one of those objects,
+        # found by querying around each of them instead of walking every cell
+        if among is not None:
+            return self.pairs_among(among)
+        result = set()
+        order = self.order
+        for cell in self.cells.values():
+            for i in range(len(cell)):
+                for j in range(i + 1, len(cell)):
+                    a, b = cell[i], cell[j]
+                    if overlaps(self.bounds[a], self.bounds[b]):
+                        result.add((a, b) if order[a] < order[b] else (b, a))
+        for a in self.unbounded:
+            for b in self.bounds:
+                if b is not a:
+                    result.add((a, b) if order[a] < order[b] else (b, a))
+        return sorted(result, key=lambda pair: (order[pair[0]], order[pair[1]]))
+
+    def pairs_among(self, objects):
+        result = set()
+        order = self.order
+        bounds = self.bounds
+        for a in objects:
+            box = bounds.get(a)
+            if box is None:
+                continue
+            if a in self.unbounded:
+                others = [b for b in bounds if b is not a]
+            else:
+                others = self.query(box, exclude=a)
+            for b in others:
+                result.add((a, b) if order[a] < order[b] else (b, a))
+        return sorted(result, key=lambda pair: (order[pair[0]], order[pair[1]]))
@@ -0,0 +1,213 @@
+import math
+import numpy as np
+from pygame.math import Vector2
+from broadphase import overlaps, fatten
+
+# Bounding volume hierarchy over static (infinite mass) geometry.
+# Built once when a level is loaded; queries cost O(log n) instead of scanning every object.
+
+def merge(a, b):
+    return (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+
+def box_distance(box, point):
+    dx = max(box[0] - point[0], 0, point[0] - box[2])
+    dy = max(box[1] - point[1], 0, point[1] - box[3])
+    return math.hypot(dx, dy)
+
+def box_raycast(box, origin, direction, max_distance):
+    # slab test, returns the entry distance or None
+    t_enter, t_exit = 0, max_distance
+    for axis in (0, 1):
+        o = origin[axis]
+        d = direction[axis]
+        lo, hi = box[axis], box[axis + 2]
+        if d == 0:
+            if o < lo or o > hi:
+                return None
+            continue
+        t0 = (lo - o) / d
+        t1 = (hi - o) / d
+        if t0 > t1:
+            t0, t1 = t1, t0
+        t_enter = max(t_enter, t0)
+        t_exit = min(t_exit, t1)
+        if t_enter > t_exit:
+            return None
+    return t_enter
+
+
+class Node:
+    def __init__(self, box, objects=None, left=None, right=None):
+        self.box = box
+        self.objects = objects  # only leaves hold (box, object) items
+        self.left = left
+        self.right = right
+
+
+class BVH:
+    def __init__(self, objects, leaf_size=4):
+        self.leaf_size = leaf_size
+        self.unbounded = []  # walls are infinite and can't live in the tree
+        self.order = {}
+        items = []
+        for o in objects:
+            self.order[o] = len(self.order)
+            box = o.aabb()
+            if all(map(math.isfinite, box)):
+                items.append((box, o))
+            else:
+                self.unbounded.append(o)
+        self.root = self.build(items) if items else None
+
+    def __len__(self):
+        return len(self.order)
+
+    def build(self, items):
+        box = items[0][0]
+        for b, o in items[1:]:
+            box = merge(box, b)
+        if len(items) <= self.leaf_size:
+            return Node(box, objects=items)
+        # split at the median centroid along the longest axis
+        axis = 0 if box[2] - box[0] >= box[3] - box[1] else 1
+        items.sort(key=lambda item: item[0][axis] + item[0][axis + 2])
+        half = len(items) // 2
+        return Node(box, left=self.build(items[:half]), right=self.build(items[half:]))
+
+    def flatten(self):
+        # the tree as arrays, with objects given by their index in build order (see from_arrays)
+        boxes, children, first, count, items, item_boxes = [], [], [], [], [], []
+        def visit(node):
+            i = len(boxes)
+            boxes.append(node.box)
+            children.append((-1, -1))
+            first.append(len(items))
+            count.append(0)
+            if node.objects is not None:
+                for b, o in node.objects:
+                    items.append(self.order[o])
+                    item_boxes.append(b)
+                count[i] = len(node.objects)
+            else:
+                children[i] = (visit(node.left), visit(node.right))
+            return i
+        if self.root is not None:
+            visit(self.root)
+        return {
+            "boxes": np.array(boxes, dtype=float).reshape(-1, 4),
+            "children": np.array(children, dtype=np.int64).reshape(-1, 2),
+            "first": np.array(first, dtype=np.int64),
+            "count": np.array(count, dtype=np.int64),
+            "items": np.array(items, dtype=np.int64),
+            "item_boxes": np.array(item_boxes, dtype=float).reshape(-1, 4),
+            "unbounded": np.array([self.order[o] for o in self.unbounded], dtype=np.int64),
+        }
+
+    @classmethod
+    def from_arrays(cls, objects, arrays, leaf_size=4):
+        # rebuild a tree saved by flatten() over the same objects, without sorting anything
+        tree = cls.__new__(cls)
+        tree.leaf_size = leaf_size
+        tree.order = {o: i for i, o in enumerate(objects)}
+        tree.unbounded = [objects[i] for i in arrays["unbounded"].tolist()]
+        boxes = [tuple(box) for box in arrays["boxes"].tolist()]
+        children = arrays["children"].tolist()
+        first = arrays["first"].tolist()
+        count = arrays["count"].tolist()
+        items = arrays["items"].tolist()
+        item_boxes = [tuple(box) for box in arrays["item_boxes"].tolist()]
+        def node(i):
+            left, right = children[i]
+            if left < 0:
+                leaf = range(first[i], first[i] + count[i])
+                return Node(boxes[i], objects=[(item_boxes[k], objects[items[k]]) for k in leaf])
+            return Node(boxes[i], left=node(left), right=node(right))
+        tree.root = node(0) if boxes else None
+        return tree
+
+    def query(self, box, exclude=None):
+        # every object whose bounds overlap box, in the order they were given at build time
+        found = [o for o in self.unbounded if o is not exclude]
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node = stack.pop()
+            if not overlaps(node.box, box):
+                continue
+            if node.objects is not None:
+                found.extend(o for b, o in node.objects if o is not exclude and overlaps(b, box))
+            else:
+                stack.append(node.left)
+                stack.append(node.right)
+        found.sort(key=self.order.__getitem__)
+        return found
+
+    def candidates(self, obj):
+        return self.query(obj.aabb(), exclude=obj)
+
+    def raycast(self, origin, direction, max_distance=math.inf, exclude=None, radius=0):
+        # returns (object, distance) for the first hit along the ray, or (None, max_distance).
+        # With radius this sweeps a circle of that radius instead of a point
+        direction = Vector2(direction)
+        if direction.length() == 0:
+            return None, max_distance
+        direction = direction.normalize()
+        hit = None
+        for o in self.unbounded:
+            if o is not exclude:
+                t = o.raycast(origin, direction, max_distance, radius)
+                if t is not None and t < max_distance:
+                    hit, max_distance = o, t
+        origin = Vector2(origin)
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node = stack.pop()
+            if box_raycast(fatten(node.box, radius), origin, direction, max_distance) is None:
+                continue
+            if node.objects is not None:
+                for b, o in node.objects:
+                    if o is not exclude:
+                        t = o.raycast(origin, direction, max_distance, radius)
+                        if t is not None and (hit is None or t < max_distance):
+                            hit, max_distance = o, t
+            else:
+                # visit the nearer child first so far branches get pruned
+                t_left = box_raycast(fatten(node.left.box, radius), origin, direction, max_distance)
+                t_right = box_raycast(fatten(node.right.box, radius), origin, direction, max_distance)
+                if t_left is not None and t_right is not None and t_right < t_left:
+                    stack.append(node.left)
+                    stack.append(node.right)
+                else:
+                    stack.append(node.right)
+                    stack.append(node.left)
+        return hit, max_distance
+
+    def nearest(self, point, max_distance=math.inf, exclude=None):
+        # returns (object, distance) for the closest object to point, or (None, max_distance)
+        best = None
+        for o in self.unbounded:
+            if o is not exclude:
+                d = o.distance(point)
+                if d < max_distance:
+                    best, max_distance = o, d
+        point = Vector2(point)
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node = stack.pop()
+            if box_distance(node.box, point) > max_distance:
+                continue
+            if node.objects is not None:
+                for b, o in node.objects:
+                    if o is not exclude:
+                        d = o.distance(point)
+                        if d < max_distance or best is None and d <= max_distance:
+                            best, max_distance = o, d
+            else:
+                left = box_distance(node.left.box, point)
+                right = box_distance(node.right.box, point)
+                if left < right:
+                    stack.append(node.right)
+                    stack.append(node.left)
+                else:
+                    stack.append(node.left)
+                    stack.append(node.right)
+        return best, max_distance
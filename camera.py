@@ -0,0 +1,34 @@
+from pygame.math import Vector2
+from broadphase import overlaps
+
+# Viewport onto the world.
+# Physics stays in fixed world coordinates; the scroll offset is only applied when drawing.
+
+class Camera:
+    def __init__(self, width, height, pos=(0,0)):
+        self.width = width
+        self.height = height
+        self.pos = Vector2(pos)  # world position of the top left corner of the screen
+
+    @property
+    def offset(self):
+        # add to a world position to get a screen position
+        return -self.pos
+
+    def follow(self, target):
+        # keep target vertically centered, like the old scroll shift did
+        self.pos.y = target.y - self.height / 2
+
+    def view(self):
+        # the visible part of the world as (min x, min y, max x, max y)
+        return (self.pos.x, self.pos.y, self.pos.x + self.width, self.pos.y + self.height)
+
+    def visible(self, obj):
+        return overlaps(obj.aabb(), self.view())
+
+    def to_world(self, point):
+        return Vector2(point) + self.pos
+
+    def to_screen(self, point):
+        return Vector2(point) - self.pos
+
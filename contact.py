@@ -3,28 +3,49 @@ from pygame.math import Vector2
 import math
 import random
 from physics_objects import Circle, Wall, Polygon
+import narrowphase
 clock = pygame.time.Clock()
 fps = 60
 dt = 1/fps
-# Returns a new contact object of the correct subtype
-# This function has been done for you.
+# random source for the normal of coincident circles; seed() makes runs repeatable
+rng = random.Random()
+
+def seed(n):
+    rng.seed(n)
+
+# Returns a new contact object of the correct subtype, or None if a and b don't touch.
+# The pair's entry in the dispatch table (filled in at the bottom of this file) says
+# which class to build and whether to swap a and b, so the lower type goes first.
+# Its separation test cheaply rejects pairs whose bounds don't overlap. The rest are
+# measured once, and only pairs that overlap get a Contact, built from that measurement.
 def generate(a, b, **kwargs):
-    # Check if a's type comes later than b's alphabetically.
-    # We will label our collision types in alphabetical order, 
-    # so the lower one needs to go first.
-    if b.contact_type < a.contact_type:
+    entry = dispatch.get((a.contact_type, b.contact_type))
+    if entry is None:
+        raise TypeError(f"no contact type for {a.contact_type} and {b.contact_type}")
+    cls, separated, swap = entry
+    if swap:
         a, b = b, a
-    # This calls the class of the appropriate name based on the two contact types.
-    return globals()[f"{a.contact_type}_{b.contact_type}"](a, b, **kwargs)
-    
-# Generic contact class, to be overridden by specific scenarios
+    if separated(a, b):
+        return None
+    measured = cls.measure(a, b)
+    if measured[0] <= 0:
+        return None
+    return cls(a, b, measured=measured, **kwargs)
+
+# Generic contact class, to be overridden by specific scenarios.
+# A subclass's measure(a, b) works out its state as a tuple of the values named in
+# fields, overlap first; update() stores a new measurement on the contact.
 class Contact():
-    def __init__(self, a, b, resolve=False, **kwargs):
+    fields = ("overlap", "normal")
+
+    def __init__(self, a, b, resolve=False, measured=None, **kwargs):
         self.a = a
         self.b = b
         self.kwargs = kwargs
-        self.overlap = 0
-        self.update()
+        if measured is None:
+            self.update()
+        else:
+            self.store(measured)
         self.bool = self.overlap > 0
         if resolve:
             self.bool = self.resolve(update=False)
@@ -32,9 +53,16 @@ class Contact():
     def __bool__(self):
         return self.bool 
 
-    def update(self):  # virtual function
-        self.overlap = 0
-        self.normal = Vector2(0, 0), 
+    @staticmethod
+    def measure(a, b):  # virtual function
+        return 0, Vector2(0, 0)
+
+    def store(self, measured):
+        for name, value in zip(self.fields, measured):
+            setattr(self, name, value)
+
+    def update(self):
+        self.store(self.measure(self.a, self.b))
 
     def resolve(self, restitution=None, rebound=None, friction=None, update=True):
         if update:
@@ -98,14 +126,16 @@ class Contact():
 
 # Contact class for two circles
 class Circle_Circle(Contact):
-    def update(self):  # compute the appropriate values
-        r = self.a.pos - self.b.pos
-        self.overlap = self.a.radius + self.b.radius - r.magnitude()
-        self.normal = r.normalize()
-        if r.magnitude() != 0:
-            self.normal = r.normalize()
+    @staticmethod
+    def measure(a, b):  # compute the appropriate values
+        r = a.pos - b.pos
+        distance = r.magnitude()
+        overlap = a.radius + b.radius - distance
+        if distance != 0:
+            normal = r / distance
         else:
-            self.normal = Vector2(1, 0).rotate(random.uniform(0,360))
+            normal = Vector2(1, 0).rotate(rng.uniform(0,360))
+        return overlap, normal
 
     def point(self):
         return self.a.pos - self.a.radius * self.normal
@@ -119,70 +149,78 @@ class Circle_Polygon(Contact):
         self.polygon = b
         super().__init__(a, b, **kwargs)
 
-    def update(self):  # compute the appropriate values
-        self.overlap = math.inf
-        for i, (wall_pos, wall_normal) in enumerate (zip(self.polygon.points, self.polygon.normals)):
-            r = self.circle.pos - wall_pos
-            overlap = self.circle.radius - r * wall_normal
-
-            if overlap < self.overlap:
-                self.overlap = overlap
-                self.normal = wall_normal
-
-                index = i
-        
+    @staticmethod
+    def measure(circle, polygon):  # compute the appropriate values
+        points = polygon.points
+        if len(points) >= narrowphase.circle_polygon_threshold:
+            least, index = narrowphase.circle_polygon(circle, polygon)
+            normal = polygon.normals[index]
+        else:
+            least = math.inf
+            for i, (wall_pos, wall_normal) in enumerate (zip(points, polygon.normals)):
+                r = circle.pos - wall_pos
+                overlap = circle.radius - r * wall_normal
 
-        if 0 < self.overlap < self.circle.radius:
-            r = self.circle.pos - self.polygon.points[index]
+                if overlap < least:
+                    least = overlap
+                    normal = wall_normal
 
-            s = self.polygon.points[index - 1] - self.polygon.points[index]
+                    index = i
 
+        # near a corner the circle touches the corner rather than the face
+        if 0 < least < circle.radius:
+            r = circle.pos - points[index]
+            s = points[index - 1] - points[index]
             if r * s < 0:
-                self.normal = r.normalize()
-                self.overlap = self.circle.radius - r.magnitude()
-                
-            
-            
-            r = self.circle.pos - self.polygon.points[index - 1]
-            s = self.polygon.points[index] - self.polygon.points[index - 1]
+                normal = r.normalize()
+                least = circle.radius - r.magnitude()
+
+            r = circle.pos - points[index - 1]
+            s = points[index] - points[index - 1]
             if r * s < 0:
-                self.normal = r.normalize()
-                self.overlap = self.circle.radius - r.magnitude()
-            
+                normal = r.normalize()
+                least = circle.radius - r.magnitude()
+        return least, normal
+
     def point(self):
         return self.circle.pos - self.circle.radius * self.normal
 class Polygon_Wall(Contact):
+    fields = ("overlap", "normal", "index")
+
     def __init__(self, a, b, **kwargs):
         self.polygon = a
         self.wall = b
         super().__init__(a, b, **kwargs)
 
-    def update(self):  # compute the appropriate values
-        self.overlap = -math.inf
+    @staticmethod
+    def measure(polygon, wall):  # compute the appropriate values
+        most = -math.inf
         # loop over all polygon points
-        for i, point in enumerate(self.polygon.points):
+        for i, point in enumerate(polygon.points):
         # find the overlap of that point with the wall
-            r = point - self.wall.pos
-            overlap = 0 - r.dot(self.wall.normal)
-            # if the overlap is greater than self.overlap
-            # set self.overlap, self.normal, and self.index
-            if overlap > self.overlap:
-                self.overlap = overlap
-                self.normal = self.wall.normal
-                self.index = i
+            r = point - wall.pos
+            overlap = 0 - r.dot(wall.normal)
+            # keep the deepest point
+            if overlap > most:
+                most = overlap
+                index = i
+        return most, wall.normal, index
 
     def point(self):
         return self.polygon.points[self.index]
 # Empty class for Wall - Wall collisions
 # The intersection of two infinite walls is not interesting, so skip them
 class Polygon_Polygon(Contact):
-    def update(self):
-        self.a:Polygon
-        self.b:Polygon
-        self.overlap = math.inf # holds the least overlap
+    fields = ("overlap", "normal", "index", "polygon")
+
+    @staticmethod
+    def measure(a, b):
+        if len(a.points) * len(b.points) >= narrowphase.polygon_polygon_threshold:
+            return narrowphase.polygon_polygon(a, b)
+        least = math.inf # holds the least overlap
         #Case 1: a is polygon, b is list of walls
-        polygon = self.a
-        for (wall_pos, wall_normal) in zip(self.b.points, self.b.normals):
+        polygon = a
+        for (wall_pos, wall_normal) in zip(b.points, b.normals):
             # find the overlap of the polygon with the wall
             wall_overlap = -math.inf
             # loop over all polygon points
@@ -195,16 +233,16 @@ class Polygon_Polygon(Contact):
                 if overlap > wall_overlap:
                     wall_overlap = overlap
                     wall_index = i
-            # see if wall_overlap is less than self.overlap
-            if wall_overlap < self.overlap:
-                self.overlap = wall_overlap
-                self.normal = wall_normal
-                self.index = wall_index
-                self.polygon = polygon # the polygon that the most overlap point belongs to
+            # see if wall_overlap is less than the least overlap so far
+            if wall_overlap < least:
+                least = wall_overlap
+                normal = wall_normal
+                index = wall_index
+                deepest = polygon # the polygon that the most overlap point belongs to
 
         #Case 2: b is polygon, a is list of walls
-        polygon = self.b
-        for (wall_pos, wall_normal) in zip(self.a.points, self.a.normals):
+        polygon = b
+        for (wall_pos, wall_normal) in zip(a.points, a.normals):
             # find the overlap of the polygon with the wall
             wall_overlap = -math.inf
             # loop over all polygon points
@@ -217,15 +255,45 @@ class Polygon_Polygon(Contact):
                 if overlap > wall_overlap:
                     wall_overlap = overlap
                     wall_index = i
-            # see if wall_overlap is less than self.overlap
-            if wall_overlap < self.overlap:
-                self.overlap = wall_overlap
-                self.normal = -wall_normal
-                self.index = wall_index
-                self.polygon = polygon # the polygon that the most overlap point belongs to
+            # see if wall_overlap is less than the least overlap so far
+            if wall_overlap < least:
+                least = wall_overlap
+                normal = -wall_normal
+                index = wall_index
+                deepest = polygon # the polygon that the most overlap point belongs to
+        return least, normal, index, deepest
 
     def point(self):
         return self.polygon.points[self.index]
 class Wall_Wall(Contact):
     pass
 
+
+# Separation tests, run before measuring a pair. They only do cheap rejects: a test
+# that settles every separated pair costs as much as measuring, and touching pairs
+# (everything resting on something) would pay for both.
+def boxes_apart(a, b):
+    a, b = a.aabb(), b.aabb()
+    return a[0] > b[2] or b[0] > a[2] or a[1] > b[3] or b[1] > a[3]
+
+def never_apart(a, b):
+    return False  # walls are unbounded, so measuring is the only test
+
+def always_apart(a, b):
+    return True
+
+
+# (type, type) -> (contact class, separation test, swap a and b)
+dispatch = {}
+
+def register(cls, separated):
+    a, b = cls.__name__.split("_")
+    dispatch[(a, b)] = (cls, separated, False)
+    if a != b:
+        dispatch[(b, a)] = (cls, separated, True)
+
+register(Circle_Circle, boxes_apart)
+register(Circle_Polygon, boxes_apart)
+register(Polygon_Polygon, boxes_apart)
+register(Polygon_Wall, never_apart)
+register(Wall_Wall, always_apart)
@@ -0,0 +1,175 @@
+import math
+from collections import namedtuple
+from pygame.math import Vector2
+
+import physics_objects
+
+# Level loading: turns the objects of a Tiled .tmx map into physics objects.
+# Nothing here needs a display, so levels can be loaded headless.
+
+# Material properties live in a side table rather than on every object. A level
+# uses only a few different combinations of them, so each combination is stored once
+# in materials and an object keeps the index of its own. score can change every frame,
+# so it stays on the object instead of adding table entries.
+Material = namedtuple("Material", "restitution rebound resolve pinball_type")
+materials = []  # index -> Material
+material_index = {}  # Material -> index
+
+def hashable(value):
+    # lists (comma separated TMX properties) become tuples so they can key the table
+    if isinstance(value, list):
+        return tuple(hashable(x) for x in value)
+    return value
+
+def material_id(m):
+    # the index of m in the table, adding it the first time it is seen
+    m = Material(*(hashable(value) for value in m))
+    i = material_index.get(m)
+    if i is None:
+        i = material_index[m] = len(materials)
+        materials.append(m)
+    return i
+
+def material_property(name):
+    def get(self):
+        return getattr(materials[self._material], name)
+    def set(self, value):
+        self._material = material_id(materials[self._material]._replace(**{name: value}))
+    return property(get, set)
+
+# This class implements properties you want to have in all objects
+class CustomObject:
+    __slots__ = ()  # the classes below add the _material and score slots
+    restitution = material_property("restitution")
+    rebound = material_property("rebound")
+    resolve = material_property("resolve")
+    pinball_type = material_property("pinball_type")
+
+    def __init__(self, mass=math.inf, restitution=0.2, rebound = 0, score = 0, resolve=True, pinball_type="", thickness=0, **kwargs):
+        self._material = material_id(Material(restitution, rebound, resolve, pinball_type))
+        self.score = score
+        super().__init__(mass=mass, width=thickness, **kwargs)  # default is now infinite mass
+
+# These class definitions call CustomObject first in inheritance.
+# They extend the definitions form physics_objects.py.
+class Polygon(CustomObject, physics_objects.Polygon):
+    __slots__ = ("_material", "score")
+class Circle(CustomObject, physics_objects.Circle):
+    __slots__ = ("_material", "score")
+class Wall(CustomObject, physics_objects.Wall):
+    __slots__ = ("_material", "score")
+class Explosion(Circle):
+    __slots__ = ("max_radius", "expansion_speed")
+
+    def __init__(self, max_radius, expansion_speed, **kwargs):
+        self.max_radius = max_radius
+        self.expansion_speed = expansion_speed
+        super().__init__(**kwargs)
+    
+    def update(self, dt):
+        super().update(dt)
+        self.radius += self.expansion_speed * dt
+        if self.radius > self.max_radius:
+            self.expansion_speed = 0
+            self.radius = self.max_radius
+
+    
+# Functions
+# Helper function to parse hex color data
+def parse_color(c):
+    a = int(c[1:3], 16)
+    r = int(c[3:5], 16)
+    g = int(c[5:7], 16)
+    b = int(c[7:9], 16)
+    return r,g,b,a
+
+# Parse a pytmx object into a physics object
+def parse_object(o, tmxdata):
+    # Additional properties stored in kwargs
+    print(vars(o))
+    kwargs = dict()
+    for key in o.properties:
+        value = o.properties[key]
+        if isinstance(value, str):
+            # color
+            if value[0] == "#":
+                kwargs[key] = parse_color(value)
+            # list
+            elif "," in value:
+                alist = value.split(",")
+                for i, x in enumerate(alist):
+                    try:
+                        if float(x) == int(x):
+                            alist[i] = int(x)
+                        else:
+                            alist[i] = float(x)
+                    except:
+                        pass
+                kwargs[key] = alist
+            # string
+            else: 
+                kwargs[key] = value
+        else: # int, float, bool
+            kwargs[key] = value
+    
+    # Polygon
+    if hasattr(o, "points"):  
+        pos = o.points[0]
+        points = [Vector2(p.x - pos.x, p.y - pos.y) for p in o.points]
+        # handle pivot point that points to a point object in Tiled
+        if "pivot" in kwargs:
+            p = tmxdata.get_object_by_id(kwargs["pivot"])
+            pivot = Vector2(p.x - pos.x, p.y - pos.y)
+            del kwargs["pivot"]
+        else: 
+            pivot = Vector2(0,0)
+        shape = Polygon(pos=pos, local_points=points, angle=o.rotation, **kwargs)
+        if pivot:
+            shape.reshape([p - pivot.rotate(-shape.angle) for p in shape.local_points])
+            shape.pos += pivot
+        return shape
+        
+    
+    # Circle (squares are interpreted as circles)
+    elif o.width == o.height:  
+        center = (o.x + o.width/2, o.y + o.height/2)
+        return Circle(pos=center, radius=o.width/2, **kwargs)
+    
+    # Rectangle (non-circular ellipses are interpreted as rectangles)
+    else:
+        points = [(0,0), (o.width,0), (o.width, o.height), (0, o.height)]
+        pos = Vector2(o.x, o.y)
+        # handle pivot point that points to a point object in Tiled
+        if "pivot" in kwargs:
+            p = tmxdata.get_object_by_id(kwargs["pivot"])
+            pivot = Vector2(p.x - pos.x, p.y - pos.y)
+            del kwargs["pivot"]
+        else: 
+            pivot = Vector2(0,0)
+        if "Color" in kwargs:
+            print(pos)
+        shape = Polygon(pos=pos, local_points=points, angle=o.rotation, **kwargs)
+        if pivot:
+            shape.reshape([p - pivot.rotate(-shape.angle) for p in shape.local_points])
+            shape.pos += pivot
+        return shape
+
+# Parse every object of a loaded tmx map
+def parse(tmxdata):
+    objects = [parse_object(o, tmxdata) for o in tmxdata.objects]
+    objects = [o for o in objects if o is not None]
+
+    # player
+    for o in objects:
+        if o.pinball_type == "player":
+            player = o
+            player.mass = 1
+            player.reshape([p - Vector2(45,45)/2 for p in player.local_points])
+            player.pos += Vector2(45,45)/2
+    return objects
+
+# Load data from a tmx file without loading any images.
+# pytmx is only needed here; levelcache.load() avoids it once a level is compiled
+def load(filename):
+    import pytmx
+    return parse(pytmx.TiledMap(filename))
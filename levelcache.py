@@ -0,0 +1,193 @@
+import hashlib
+import json
+import math
+import os
+import struct
+import sys
+
+import numpy as np
+
+from level import Polygon, Circle
+import level
+import bvh
+
+# Compiled levels.
+# Parsing a .tmx needs pytmx, prints every object and rebuilds every polygon with
+# its convexity check. compile_level() does that once and writes a compact binary
+# file next to the level: packed local vertices and normals, pose, mass properties
+# and bounds per object, the static BVH, and a small JSON header with the game
+# properties. load() memory maps that file and rebuilds the objects straight from
+# the arrays; it only recompiles when the .tmx has changed, so the game runs
+# without pytmx as long as the compiled file is there.
+#
+#   python levelcache.py Level_Test.tmx
+
+magic = b"GBLEVEL\x01"
+kinds = {"Polygon": Polygon, "Circle": Circle}
+
+
+class CompiledLevel:
+    def __init__(self, objects, static):
+        self.objects = objects
+        self.static = static  # BVH over the objects with infinite mass, for Simulation
+
+
+def cache_path(filename):
+    return os.path.splitext(filename)[0] + ".level"
+
+def source_hash(filename):
+    with open(filename, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+def properties(o):
+    # the constructor arguments of o other than pose, shape and mass properties
+    kwargs = {"restitution": o.restitution, "rebound": o.rebound, "score": o.score, "resolve": o.resolve,
+              "pinball_type": o.pinball_type, "thickness": o.width, "color": list(o.color),
+              "vel": [o.vel.x, o.vel.y], "avel": o.avel, "torque": o.torque}
+    if isinstance(o, Polygon):
+        kwargs["normals_length"] = o.normals_length
+    else:
+        kwargs["fixed"] = o.fixed
+    return kwargs
+
+def compile_level(filename, path=None):
+    # parse filename with pytmx and write its compiled form to path
+    path = path or cache_path(filename)
+    objects = level.load(filename)
+    records, points, normals = [], [], []
+    for o in objects:
+        kind = type(o).__name__
+        if kind not in kinds:
+            raise TypeError(f"can't compile level object of type {kind}")
+        record = {"kind": kind, "properties": properties(o), "first": len(points)}
+        if kind == "Polygon":
+            points.extend((p.x, p.y) for p in o.local_points)
+            normals.extend((n.x, n.y) for n in o.local_normals)
+            record["count"] = len(o.local_points)
+        records.append(record)
+    n = len(objects)
+    static = [o for o in objects if o.mass == math.inf]
+    arrays = {
+        "points": np.array(points, dtype=float).reshape(-1, 2),
+        "normals": np.array(normals, dtype=float).reshape(-1, 2),
+        "pose": np.array([(o.pos.x, o.pos.y, o.angle) for o in objects], dtype=float).reshape(n, 3),
+        "mass": np.array([o.mass for o in objects], dtype=float),
+        "momi": np.array([o.momi for o in objects], dtype=float),
+        "radius": np.array([getattr(o, "radius", 0) for o in objects], dtype=float),
+        "bounds": np.array([o.aabb() for o in objects], dtype=float).reshape(n, 4),
+    }
+    for name, array in bvh.BVH(static).flatten().items():
+        arrays["bvh_" + name] = array
+    stat = os.stat(filename)
+    header = {"source": os.path.basename(filename), "mtime": stat.st_mtime_ns, "size": stat.st_size,
+              "sha1": source_hash(filename), "objects": records}
+    write(path, header, arrays)
+    return path
+
+def write(path, header, arrays):
+    # magic, header length, JSON header, then every array back to back
+    table = {}
+    offset = 0
+    for name, array in arrays.items():
+        table[name] = (array.dtype.str, array.shape, offset)
+        offset += array.nbytes
+    header = dict(header, arrays=table)
+    blob = json.dumps(header).encode()
+    blob += b" " * (-len(blob) % 8)  # keep the arrays 8 byte aligned
+    temp = path + ".tmp"
+    with open(temp, "wb") as f:
+        f.write(magic)
+        f.write(struct.pack("<Q", len(blob)))
+        f.write(blob)
+        for array in arrays.values():
+            f.write(np.ascontiguousarray(array).tobytes())
+    os.replace(temp, path)  # never leave a half written file for another process to load
+
+def read(path):
+    # the header and read only arrays backed by a memory map of path
+    data = np.memmap(path, dtype=np.uint8, mode="r")
+    if bytes(data[:len(magic)]) != magic:
+        raise ValueError(f"{path} is not a compiled level")
+    start = len(magic) + 8
+    length, = struct.unpack("<Q", bytes(data[len(magic):start]))
+    header = json.loads(bytes(data[start:start + length]))
+    base = start + length
+    arrays = {}
+    for name, (dtype, shape, offset) in header["arrays"].items():
+        count = int(np.prod(shape))
+        if count:
+            arrays[name] = np.frombuffer(data, dtype=dtype, count=count, offset=base + offset).reshape(shape)
+        else:
+            arrays[name] = np.zeros(shape, dtype=dtype)
+    return header, arrays
+
+def fresh(header, filename):
+    # is a compiled header still valid for the source file filename
+    if not os.path.exists(filename):
+        return True  # shipped without its source
+    stat = os.stat(filename)
+    if header["mtime"] == stat.st_mtime_ns and header["size"] == stat.st_size:
+        return True
+    return header["sha1"] == source_hash(filename)  # touched but not changed
+
+class LevelData:
+    # a compiled level left in its memory mapped arrays, building objects on demand
+    def __init__(self, header, arrays):
+        self.records = header["objects"]
+        self.arrays = arrays
+
+    def __len__(self):
+        return len(self.records)
+
+    def properties(self, i):
+        return self.records[i]["properties"]
+
+    def static(self, i):
+        return self.arrays["mass"][i] == math.inf
+
+    def bounds(self, i):
+        return tuple(self.arrays["bounds"][i].tolist())
+
+    def build(self, i):
+        # a new object for record i
+        arrays = self.arrays
+        record = self.records[i]
+        kwargs = dict(record["properties"])
+        kwargs["color"] = tuple(kwargs["color"])
+        x, y, angle = arrays["pose"][i].tolist()
+        mass = float(arrays["mass"][i])
+        momi = float(arrays["momi"][i])
+        if record["kind"] == "Polygon":
+            first, last = record["first"], record["first"] + record["count"]
+            return Polygon(pos=(x, y), angle=angle, mass=mass, momi=momi, local_points=arrays["points"][first:last].tolist(),
+                           local_normals=arrays["normals"][first:last].tolist(), **kwargs)
+        return Circle(pos=(x, y), angle=angle, mass=mass, momi=momi, radius=float(arrays["radius"][i]), **kwargs)
+
+def build(data):
+    # every object of data, with the static BVH saved alongside them
+    objects = [data.build(i) for i in range(len(data))]
+    static = [o for o in objects if o.mass == math.inf]
+    tree = {name[len("bvh_"):]: array for name, array in data.arrays.items() if name.startswith("bvh_")}
+    return CompiledLevel(objects, bvh.BVH.from_arrays(static, tree))
+
+def load_data(filename, path=None):
+    # the compiled data of the level in filename, compiling it first if there is
+    # no up to date compiled file
+    path = path or cache_path(filename)
+    if os.path.exists(path):
+        try:
+            header, arrays = read(path)
+        except ValueError:
+            header = None
+        if header is not None and fresh(header, filename):
+            return LevelData(header, arrays)
+    compile_level(filename, path)
+    return LevelData(*read(path))
+
+def load(filename, path=None):
+    # every object of the level in filename at once
+    return build(load_data(filename, path))
+
+if __name__ == "__main__":
+    for filename in sys.argv[1:]:
+        print(compile_level(filename))
@@ -0,0 +1,97 @@
+import numpy as np
+
+# Vectorized separating axis tests for the contact classes in contact.py.
+# NumPy has a fixed cost per call, so contact.py only takes these paths once
+# a pair has enough vertices to beat the plain Python loops.
+polygon_polygon_threshold = 64  # len(a.points) * len(b.points)
+circle_polygon_threshold = 32  # len(polygon.points)
+
+def wall_overlaps(points, wall_points, wall_normals):
+    # overlap[j, i] of point i past wall j, computed the same way as the Python loops
+    # (0 - (point - wall_pos) * wall_normal) so ties resolve to the same index
+    r = points[None, :, :] - wall_points[:, None, :]
+    return -(r[..., 0] * wall_normals[:, None, 0] + r[..., 1] * wall_normals[:, None, 1])
+
+def polygon_polygon(a, b):
+    # returns overlap, normal, index, polygon exactly as Polygon_Polygon.update sets them
+    a_points, a_normals = a.arrays()
+    b_points, b_normals = b.arrays()
+
+    # Case 1: points of a against the walls of b
+    overlaps = wall_overlaps(a_points, b_points, b_normals)
+    deepest = overlaps.max(axis=1)
+    j = int(deepest.argmin())
+    overlap = deepest[j]
+    normal = b.normals[j]
+    index = int(overlaps[j].argmax())
+    polygon = a
+
+    # Case 2: points of b against the walls of a
+    overlaps = wall_overlaps(b_points, a_points, a_normals)
+    deepest = overlaps.max(axis=1)
+    j = int(deepest.argmin())
+    if deepest[j] < overlap:
+        overlap = deepest[j]
+        normal = -a.normals[j]
+        index = int(overlaps[j].argmax())
+        polygon = b
+    return float(overlap), normal, index, polygon
+
+def circle_polygon(circle, polygon):
+    # returns the least face overlap and its index, as the first loop in Circle_Polygon.update
+    points, normals = polygon.arrays()
+    r = (circle.pos.x, circle.pos.y) - points
+    overlaps = circle.radius - (r[:, 0] * normals[:, 0] + r[:, 1] * normals[:, 1])
+    index = int(overlaps.argmin())
+    return float(overlaps[index]), index
+
+def stack(polygons):
+    # concatenate the world arrays of many polygons and return where each one starts
+    arrays = [p.arrays() for p in polygons]
+    counts = [len(points) for points, normals in arrays]
+    starts = np.cumsum([0] + counts[:-1])
+    points = np.concatenate([points for points, normals in arrays])
+    normals = np.concatenate([normals for points, normals in arrays])
+    return points, normals, starts
+
+def polygon_polygon_batch(polygon, others):
+    # separating axis overlap of polygon against each of others in one pass.
+    # Positive entries are exactly the pairs Polygon_Polygon reports as touching;
+    # run the single pair test on those to get normal and index.
+    if not others:
+        return np.zeros(0)
+    a_points, a_normals = polygon.arrays()
+    points, normals, starts = stack(others)
+    # points of polygon against every wall of the others
+    case1 = np.minimum.reduceat(wall_overlaps(a_points, points, normals).max(axis=1), starts)
+    # points of the others against every wall of polygon
+    case2 = np.maximum.reduceat(wall_overlaps(points, a_points, a_normals), starts, axis=1).min(axis=0)
+    return np.minimum(case1, case2)
+
+def circle_polygon_batch(circle, polygons):
+    # least face overlap of circle against each polygon in one pass.
+    # A contact needs a positive face overlap, so this rejects separated pairs;
+    # corner regions are still decided by Circle_Polygon for the survivors.
+    if not polygons:
+        return np.zeros(0)
+    points, normals, starts = stack(polygons)
+    r = (circle.pos.x, circle.pos.y) - points
+    overlaps = circle.radius - (r[:, 0] * normals[:, 0] + r[:, 1] * normals[:, 1])
+    return np.minimum.reduceat(overlaps, starts)
+
+batch_threshold = 8  # polygon candidates before the batched tests below pay off
+
+def maybe_touching(body, others):
+    # others without the polygons a batched separating axis test rules out, in order.
+    # The survivors still need contact.generate to decide and build the contact
+    if body.contact_type not in ("Circle", "Polygon"):
+        return others
+    polygons = [o for o in others if o.contact_type == "Polygon"]
+    if len(polygons) < batch_threshold:
+        return others
+    if body.contact_type == "Polygon":
+        overlaps = polygon_polygon_batch(body, polygons)
+    else:
+        overlaps = circle_polygon_batch(body, polygons)
+    apart = {o for o, overlap in zip(polygons, overlaps.tolist()) if overlap <= 0}
+    return [o for o in others if o not in apart]
@@ -1,8 +1,18 @@
 from pygame.math import Vector2
 import math
 import pygame
+import numpy as np
+import shapes
+
+# Bodies are slotted: a level or a scene can hold tens of thousands of them, and a
+# per instance __dict__ costs more than the state itself. Subclasses declare the
+# attributes they add in __slots__ too.
 
 class PhysicsObject:
+    __slots__ = ("mass", "pos", "momi", "angle", "avel", "torque", "vel", "force",
+                 "_store", "_slot")  # _store and _slot are set while in a world.BodyStore
+    sleeping = False  # only bodies in a world.BodyStore can fall asleep
+
     def __init__(self, mass=1, pos=(0,0), vel=(0,0), momi=math.inf, angle=0, avel=0, torque=0):
         self.mass = mass
         self.pos = Vector2(pos) # need to make pos a Vector2, and a new one
@@ -44,21 +54,48 @@ class PhysicsObject:
             self.angle = angle
 
 class Circle(PhysicsObject):
+    __slots__ = ("radius", "color", "width", "fixed")
+    contact_type = "Circle"
+
     def __init__(self, radius, color=(255,255,255), width=0, fixed=False, **kwargs):
         self.radius = radius
         self.color = color
         self.width = width
         self.fixed = fixed
-        self.contact_type = "Circle"
         super().__init__(**kwargs)
    
-    def draw(self, surface):
-        pygame.draw.circle(surface, self.color, self.pos, self.radius, self.width)
+    def draw(self, surface, offset=(0,0)):
+        pygame.draw.circle(surface, self.color, self.pos + offset, self.radius, self.width)
     
     def Isclick(self, point):
         return (self.pos - Vector2(point)).length() <= self.radius
+
+    def aabb(self):
+        # axis aligned bounding box as (min x, min y, max x, max y)
+        return (self.pos.x - self.radius, self.pos.y - self.radius,
+                self.pos.x + self.radius, self.pos.y + self.radius)
+
+    def raycast(self, origin, direction, max_distance=math.inf, radius=0):
+        # distance along the unit vector direction to the first hit, or None.
+        # With radius, the distance a circle of that radius can travel before touching
+        r = Vector2(origin) - self.pos
+        b = r.dot(direction)
+        c = r.dot(r) - (self.radius + radius)**2
+        if c <= 0:
+            return 0  # origin is inside the circle
+        disc = b*b - c
+        if b > 0 or disc < 0:
+            return None
+        t = -b - math.sqrt(disc)
+        return t if t <= max_distance else None
+
+    def distance(self, point):
+        return max(0, (Vector2(point) - self.pos).length() - self.radius)
     
 class Wall(PhysicsObject):
+    __slots__ = ("point1", "point2", "color", "width", "normal")
+    contact_type = "Wall"
+
     def __init__(self, point1, point2, color=(255, 255, 255), width=1):
         self.point1 = Vector2(point1)
         self.point2 = Vector2(point2)
@@ -66,13 +103,32 @@ class Wall(PhysicsObject):
         self.width = width
         direction = self.point2 - self.point1
         self.normal = Vector2(-direction.y, direction.x).normalize()
-        self.contact_type = "Wall"
         super().__init__(mass=math.inf, pos=self.point1)
     
-    def draw(self, surface):
-        pygame.draw.line(surface, self.color, self.point1, self.point2, self.width)
+    def draw(self, surface, offset=(0,0)):
+        pygame.draw.line(surface, self.color, self.point1 + offset, self.point2 + offset, self.width)
+
+    def aabb(self):
+        # walls act as infinite half planes in Polygon_Wall, so they have no finite bounds
+        return (-math.inf, -math.inf, math.inf, math.inf)
+
+    def raycast(self, origin, direction, max_distance=math.inf, radius=0):
+        # the solid side of the wall is opposite the normal
+        gap = (Vector2(origin) - self.pos).dot(self.normal) - radius
+        if gap <= 0:
+            return 0
+        denom = self.normal.dot(direction)
+        if denom >= 0:
+            return None
+        t = -gap / denom
+        return t if t <= max_distance else None
+
+    def distance(self, point):
+        return max(0, (Vector2(point) - self.pos).dot(self.normal))
 
 class UniformCircle(Circle):
+    __slots__ = ()
+
     def __init__(self, radius=100, density=None, mass=None, **kwargs):
         if mass is not None and density is not None:
             raise("Cannot specify both mass and density.")
@@ -91,86 +147,173 @@ class UniformCircle(Circle):
 
 
 class Polygon(PhysicsObject):
-    def __init__(self, local_points=[], color=(255,255,255), width=0, normals_length=0, **kwargs):
-        self.local_points = [Vector2(local_point) for local_point in local_points]
-        self.local_normals = []
-        for i in range(len(self.local_points)):
-            self.local_normals.append((self.local_points[i] - self.local_points[i-1]).normalize().rotate(90))
-        self.check_convex()
+    __slots__ = ("shape", "color", "width", "normals_length",
+                 "_pose", "_angle", "_offsets", "_normals", "_points", "_aabb", "_arrays")
+    contact_type = "Polygon"
+
+    def __init__(self, local_points=[], color=(255,255,255), width=0, normals_length=0, local_normals=None, shape=None, **kwargs):
+        # the local geometry is a shapes.PolygonShape shared by every polygon with the
+        # same local_points. local_normals can be passed in already worked out (outward),
+        # e.g. from a compiled level, which skips the convexity check for a new shape
+        self._pose = None  # (x, y, angle) the cached world geometry was built for
+        self._angle = None
+        self.shape = shape if shape is not None else shapes.polygon(local_points, local_normals)
         self.color = color
         self.width = width
         self.normals_length = normals_length
-        self.contact_type = "Polygon"
         super().__init__(**kwargs)
-        self.update(0)
-
-    def check_convex(self):
-        if len(self.local_points) > 2:
-            n = len(self.local_points)
-            convex = True
-            for i in range(n):
-                d = [(self.local_points[j%n] - self.local_points[i]).dot(self.local_normals[i])
-                     for j in range(i+1, i+n-1)]
-                #print(min(d), max(d))
-                if max(d) <= 0:
-                    pass
-                elif min(d) >= 0:
-                    self.local_normals[i] *= -1
-                else:
-                    convex = False
-            if not convex:
-                print("WARNING! Non-convex polygon defined. Collisions will be inncorrect.")
 
+    @property
+    def local_points(self):
+        return self.shape.points
 
-    def update(self, dt):
-        super().update(dt)
-        self.points = [local_point.rotate(self.angle) + self.pos for local_point in self.local_points]
-        self.normals = [local_normal.rotate(self.angle) for local_normal in self.local_normals]
+    @property
+    def local_normals(self):
+        return self.shape.normals
+
+    def reshape(self, local_points):
+        # change the local geometry; shapes are shared, so never edit local_points in place
+        self.shape = shapes.polygon(local_points)
+        self.transform()
+
+    def transform(self):
+        # mark the world space geometry stale, e.g. after reshape().
+        # Moving or rotating the polygon doesn't need this, the pose is checked on access.
+        self._pose = None
+        self._angle = None
 
-    def draw(self, window):
-        pygame.draw.polygon(window, self.color, self.points, self.width)
+    def refresh(self):
+        # rebuild points, normals, bounds and arrays only when pos or angle changed
+        pos = self.pos
+        angle = self.angle
+        pose = (pos.x, pos.y, angle)
+        if pose == self._pose:
+            return
+        if angle != self._angle:
+            # shared with every body of the same shape at the same angle
+            self._offsets, self._normals = self.shape.rotated(angle)
+            self._angle = angle
+        self._points = [offset + pos for offset in self._offsets]
+        xs = [point.x for point in self._points]
+        ys = [point.y for point in self._points]
+        self._aabb = (min(xs), min(ys), max(xs), max(ys))
+        self._arrays = None
+        self._pose = pose
+
+    @property
+    def points(self):
+        self.refresh()
+        return self._points
+
+    @property
+    def normals(self):
+        self.refresh()
+        return self._normals
+
+    def arrays(self):
+        # world points and normals as (n, 2) numpy arrays, built on demand for narrowphase.py
+        self.refresh()
+        if self._arrays is None:
+            self._arrays = (np.array([(p.x, p.y) for p in self._points], dtype=float).reshape(-1, 2),
+                            np.array([(n.x, n.y) for n in self._normals], dtype=float).reshape(-1, 2))
+        return self._arrays
+
+    def aabb(self):
+        self.refresh()
+        return self._aabb
+
+    def raycast(self, origin, direction, max_distance=math.inf, radius=0):
+        # clip the ray against every edge's half plane (normals point outward).
+        # With radius this sweeps a circle, see sweep()
+        if radius > 0:
+            return self.sweep(origin, direction, max_distance, radius)
+        origin = Vector2(origin)
+        t_enter, t_exit = 0, max_distance
+        for point, normal in zip(self.points, self.normals):
+            gap = (origin - point).dot(normal) - radius
+            denom = normal.dot(direction)
+            if denom == 0:
+                if gap > 0:
+                    return None
+            elif denom < 0:
+                t_enter = max(t_enter, -gap / denom)
+            else:
+                t_exit = min(t_exit, -gap / denom)
+            if t_enter > t_exit:
+                return None
+        return t_enter
+
+    def sweep(self, origin, direction, max_distance, radius):
+        # distance a circle of radius travels along direction before touching the
+        # polygon: the first hit on the polygon rounded by radius, which is every edge
+        # pushed out by radius plus a circle of radius around every vertex
+        origin = Vector2(origin)
+        if self.distance(origin) <= radius:
+            return 0
+        points, normals = self.points, self.normals
+        best = max_distance
+        hit = False
+        for i in range(len(points)):
+            p0, p1, normal = points[i-1], points[i], normals[i]
+            # the edge pushed out, only where the circle touches the edge itself
+            gap = (origin - p1).dot(normal) - radius
+            denom = normal.dot(direction)
+            if gap > 0 and denom < 0:
+                t = -gap / denom
+                if t <= best:
+                    edge = p1 - p0
+                    u = (origin + direction * t - normal * radius - p0).dot(edge)
+                    if 0 <= u <= edge.length_squared():
+                        best, hit = t, True
+            # the vertex, like Circle.raycast
+            r = origin - p1
+            b = r.dot(direction)
+            disc = b*b - (r.dot(r) - radius*radius)
+            if b < 0 and disc >= 0:
+                t = -b - math.sqrt(disc)
+                if t <= best:
+                    best, hit = t, True
+        return best if hit else None
+
+    def distance(self, point):
+        point = Vector2(point)
+        gaps = [(point - p).dot(n) for p, n in zip(self.points, self.normals)]
+        if max(gaps) <= 0:
+            return 0  # inside
+        best = math.inf
+        for i in range(len(self.points)):
+            p0, p1 = self.points[i-1], self.points[i]
+            edge = p1 - p0
+            length2 = edge.length_squared()
+            u = 0 if length2 == 0 else min(1, max(0, (point - p0).dot(edge) / length2))
+            best = min(best, (point - (p0 + u*edge)).length())
+        return best
+
+    def draw(self, window, offset=(0,0)):
+        points = [point + offset for point in self.points]
+        pygame.draw.polygon(window, self.color, points, self.width)
         if self.normals_length > 0:
-            for point, normal in zip(self.points, self.normals):
+            for point, normal in zip(points, self.normals):
                 pygame.draw.line(window, self.color, point, point + normal*self.normals_length)
     
-    def set(self, pos=None, angle=None):
-        super().set(pos=pos, angle=angle)
-        self.update(0)
 
 class UniformPolygon(Polygon):
+    __slots__ = ()
+
     def __init__(self, density=None, local_points=[], pos=[0,0], angle=0, shift=True, mass=None, **kwargs):
         if mass is not None and density is not None:
             raise("Cannot specify both mass and density.")
         if mass is None and density is None:
             mass = 1 # if neither mass or density is specified, default to mass = 1
             density = 1 # it must be defined, but its value doesn't matter when mass is specified
-        
-        # Calculate mass, moment of inertia, and center of mass based on density
-        # by looping over all "triangles" of the polygon
-        total_mass = 0
-        total_momi = 0
-        center_of_mass_numerator = Vector2(0,0)
-        for i in range(len(local_points)):
-            # triangle mass
-            s0 = Vector2(local_points[i])
-            s1 = Vector2(local_points[i-1])
-            # triangle moment of inertia
-            tri_area = 0.5 * s0.cross(s1)
-            tri_area = 0.5 * Vector2.cross(s0, s1) # another way to write it
-            # triangle center of mass
-            delta_mass = density * tri_area
-            # add to total mass
-            total_mass += delta_mass
-            # add to total moment of inertia
-            delta_in = (delta_mass / 6) * (s0 * s0 + s1 * s1 + s0 * s1)
-            total_momi += delta_in
-            # add to center of mass numerator
-            pass
-                    
-        # calculate total center of mass by dividing numerator by denominator (total mass)
-        com = center_of_mass_numerator / total_mass
 
-        delta_com = (s0 + s1) / 3
+        # area, center of mass and moment of inertia come from the shared shape,
+        # which sums them over the polygon's triangles once for every body like it
+        shape = shapes.polygon(local_points)
+        total_mass = density * shape.area
+        total_momi = density * shape.momi  # about the center of mass
+        com = shape.centroid
+
         # if mass is specified, then scale total_mass and total_momi
         if mass is not None:
             total_momi *= mass/total_mass
@@ -178,19 +321,16 @@ class UniformPolygon(Polygon):
 
         # Usually we shift local_points origin to center of mass
         if shift:
-            com = Vector2(10,5)
             # Shift all local_points by subtracting com
-            for i in range(len(local_points)):
-                local_points[i] -= com
+            shape = shapes.polygon([point - com for point in shape.points])
             # Shift pos by adding com
             pos = pos + com
-            # Use parallel axis theorem to correct the moment of inertia (total_momi)
-            total_momi_off_center = total_momi
-            total_momi = total_momi_off_center - total_mass * com.magnitude()**2
-            pass
+        else:
+            # Use parallel axis theorem to get the moment of inertia about the origin
+            total_momi += total_mass * com.magnitude()**2
 
         # Then call super().__init__() with those correct values
-        super().__init__(mass=abs(total_mass), momi=abs(total_momi), local_points=local_points, pos=pos, angle=angle, **kwargs)
+        super().__init__(mass=total_mass, momi=total_momi, shape=shape, pos=pos, angle=angle, **kwargs)
 
 # Test UniformPolygon
 shape = UniformPolygon(density=0.01, local_points=[[0,0],[20,0],[20,10],[0,10]])
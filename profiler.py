@@ -0,0 +1,128 @@
+import csv
+import json
+from collections import defaultdict, deque
+from time import perf_counter
+
+# Frame profiler.
+# Named timing scopes and counters for each frame, an on screen overlay and
+# CSV/JSON dumps. When disabled, scope() hands back one shared do-nothing
+# context manager and count() returns straight away, so it can stay in the game.
+
+class NullScope:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+null_scope = NullScope()
+
+
+class Scope:
+    __slots__ = ("times", "name", "start")
+
+    def __init__(self, times, name):
+        self.times = times
+        self.name = name
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.times[self.name] += perf_counter() - self.start
+        return False
+
+
+class Profiler:
+    def __init__(self, enabled=False, window=300, record=True):
+        self.enabled = enabled
+        self.record = record  # keep every frame for dump()
+        self.frame_times = deque(maxlen=window)  # seconds, for the percentiles
+        self.times = defaultdict(float)  # scope -> seconds in the current frame
+        self.counters = defaultdict(int)  # counter -> count in the current frame
+        self.last_times = {}
+        self.last_counters = {}
+        self.total_times = defaultdict(float)
+        self.total_counters = defaultdict(int)
+        self.records = []
+        self.frames = 0
+        self.frame_start = None
+
+    def scope(self, name):
+        if not self.enabled:
+            return null_scope
+        return Scope(self.times, name)
+
+    def count(self, name, n=1):
+        if self.enabled:
+            self.counters[name] += n
+
+    def begin_frame(self):
+        if self.enabled:
+            self.frame_start = perf_counter()
+
+    def end_frame(self):
+        if not self.enabled or self.frame_start is None:
+            return
+        frame_time = perf_counter() - self.frame_start
+        self.frame_start = None
+        self.frame_times.append(frame_time)
+        self.frames += 1
+        for name, t in self.times.items():
+            self.total_times[name] += t
+        for name, n in self.counters.items():
+            self.total_counters[name] += n
+        if self.record:
+            self.records.append({"frame": self.frames, "frame_ms": 1000 * frame_time,
+                                 **{f"{name}_ms": 1000 * t for name, t in self.times.items()},
+                                 **self.counters})
+        self.last_times = dict(self.times)
+        self.last_counters = dict(self.counters)
+        self.times.clear()
+        self.counters.clear()
+
+    def percentile(self, p):
+        # frame time in seconds at percentile p (0-100) over the recent window
+        if not self.frame_times:
+            return 0
+        ordered = sorted(self.frame_times)
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+    def summary(self):
+        frames = max(self.frames, 1)
+        return {
+            "frames": self.frames,
+            "p50_ms": 1000 * self.percentile(50),
+            "p99_ms": 1000 * self.percentile(99),
+            "scope_ms": {name: 1000 * t / frames for name, t in self.total_times.items()},
+            "counters": {name: n / frames for name, n in self.total_counters.items()},
+        }
+
+    def dump(self, path):
+        # every recorded frame as CSV (path ends in .csv) or JSON with a summary
+        if path.endswith(".csv"):
+            columns = ["frame", "frame_ms"]
+            for record in self.records:
+                columns += [key for key in record if key not in columns]
+            with open(path, "w", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=columns, restval=0)
+                writer.writeheader()
+                writer.writerows(self.records)
+        else:
+            with open(path, "w") as f:
+                json.dump({"summary": self.summary(), "frames": self.records}, f, indent=2)
+
+    def draw(self, surface, font, pos=(10,10), color=(255,255,0)):
+        # overlay with the last frame time, recent percentiles and the last frame's scopes
+        if not self.enabled or not self.frame_times:
+            return
+        lines = [f"frame {1000*self.frame_times[-1]:.2f} ms  "
+                 f"p50 {1000*self.percentile(50):.2f}  p99 {1000*self.percentile(99):.2f}"]
+        lines += [f"{name} {1000*t:.2f} ms" for name, t in self.last_times.items()]
+        lines += [f"{name} {n}" for name, n in self.last_counters.items()]
+        x, y = pos
+        for line in lines:
+            text = font.render(line, True, color)
+            surface.blit(text, (x, y))
+            y += text.get_height()
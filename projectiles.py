@@ -0,0 +1,90 @@
+from pygame import Color
+from pygame.math import Vector2
+
+from physics_objects import UniformCircle
+from level import Explosion
+
+# Pooled lasers and explosions.
+# Every laser and explosion is built once up front and recycled through a free list,
+# so rapid fire and chain explosions don't construct new bodies (UniformCircle works
+# out mass and inertia in its constructor). Live lasers sit in the simulation's
+# BodyStore, so they are integrated together with every other body in one pass.
+
+class Pool:
+    def __init__(self, make, capacity):
+        self.make = make  # builds one pooled object
+        self.free = [make() for i in range(capacity)]
+        self.live = []  # objects in use; releasing one moves the last into its place
+        self.index = {}  # object -> position in live
+        self.created = capacity
+
+    def __len__(self):
+        return len(self.live)
+
+    def __iter__(self):
+        return iter(self.live)
+
+    def acquire(self):
+        # a free object, or a new one if the pool has run dry (it is kept afterwards)
+        if self.free:
+            obj = self.free.pop()
+        else:
+            obj = self.make()
+            self.created += 1
+        self.index[obj] = len(self.live)
+        self.live.append(obj)
+        return obj
+
+    def release(self, obj):
+        i = self.index.pop(obj)
+        last = self.live.pop()
+        if last is not obj:
+            self.live[i] = last
+            self.index[last] = i
+        self.free.append(obj)
+
+
+class Lazers(Pool):
+    def __init__(self, store, capacity=64, radius=5, density=500, gravity=(0,480), color=Color('yellow')):
+        self.store = store
+        self.gravity = gravity
+        super().__init__(lambda: UniformCircle(radius=radius, density=density, color=color), capacity)
+
+    def fire(self, pos, vel):
+        lazer = self.acquire()
+        lazer.pos = Vector2(pos)
+        lazer.vel = Vector2(vel)
+        lazer.angle = 0
+        lazer.avel = 0
+        lazer.clear_force()
+        return self.store.add(lazer, gravity=self.gravity)
+
+    def release(self, lazer):
+        self.store.remove(lazer)
+        super().release(lazer)
+
+
+class Explosions(Pool):
+    def __init__(self, capacity=16, radius=5, max_radius=50, expansion_speed=200, thickness=5, color=Color('white')):
+        self.radius = radius
+        self.expansion_speed = expansion_speed
+        super().__init__(lambda: Explosion(pos=(0,0), radius=radius, mass=1, color=color, thickness=thickness,
+                                           max_radius=max_radius, expansion_speed=expansion_speed), capacity)
+
+    def spawn(self, pos):
+        e = self.acquire()
+        e.pos = Vector2(pos)
+        e.radius = self.radius
+        e.expansion_speed = self.expansion_speed
+        return e
+
+    def update(self, dt):
+        # grow every live explosion and release the ones that reached full size
+        finished = []
+        for e in self.live:
+            e.update(dt)
+            if e.radius == e.max_radius:
+                finished.append(e)
+        for e in finished:
+            self.release(e)
+        return finished
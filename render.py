@@ -0,0 +1,123 @@
+import math
+import pygame
+
+# Cached drawing.
+# Static geometry never changes, so StaticLayer draws it once into tile surfaces
+# and only blits the tiles the camera sees; moving bodies are still drawn one by one.
+# TextCache keeps rendered HUD text until its string changes.
+
+class StaticLayer:
+    def __init__(self, static, tile_size=512, max_tiles=32, margin=8):
+        self.static = static  # the BVH of the static objects
+        self.tile_size = tile_size
+        self.max_tiles = max_tiles  # tiles kept, the least recently used are dropped first
+        self.margin = margin  # outlines can be drawn a little past an object's bounds
+        self.tiles = {}  # (i, j) -> surface, least recently used first
+
+    def __len__(self):
+        return len(self.tiles)
+
+    def invalidate(self, static=None):
+        # forget every tile, e.g. after streaming changed the static geometry
+        if static is not None:
+            self.static = static
+        self.tiles.clear()
+
+    def tile(self, i, j):
+        surface = self.tiles.pop((i, j), None)
+        if surface is None:
+            size = self.tile_size
+            surface = pygame.Surface((size, size), pygame.SRCALPHA)
+            x, y = i * size, j * size
+            m = self.margin
+            for o in self.static.query((x - m, y - m, x + size + m, y + size + m)):
+                o.draw(surface, (-x, -y))
+            if len(self.tiles) >= self.max_tiles:
+                del self.tiles[next(iter(self.tiles))]
+        self.tiles[(i, j)] = surface
+        return surface
+
+    def draw(self, surface, camera):
+        # blit the tiles under the camera's view; returns how many were blitted
+        size = self.tile_size
+        x0, y0, x1, y1 = camera.view()
+        offset = camera.offset
+        blitted = 0
+        for j in range(math.floor(y0 / size), math.floor(y1 / size) + 1):
+            for i in range(math.floor(x0 / size), math.floor(x1 / size) + 1):
+                surface.blit(self.tile(i, j), (i * size + offset.x, j * size + offset.y))
+                blitted += 1
+        return blitted
+
+
+class TextCache:
+    def __init__(self, font, max_size=32):
+        self.font = font
+        self.max_size = max_size
+        self.rendered = {}  # (text, color) -> surface
+
+    def render(self, text, color=(255,255,255)):
+        # font.render(text, True, color), reusing the surface while text is unchanged
+        key = (text, tuple(color))
+        surface = self.rendered.get(key)
+        if surface is None:
+            if len(self.rendered) >= self.max_size:
+                del self.rendered[next(iter(self.rendered))]
+            surface = self.rendered[key] = self.font.render(text, True, color)
+        return surface
+
+
+class DirtyRects:
+    # Screen areas that changed between frames.
+    # Everything drawn in a frame is marked; the areas to redraw are those marks
+    # plus the previous frame's, where the same things were before they moved.
+    # Disabled, or after invalidate(), the whole screen is redrawn.
+    def __init__(self, width, height, enabled=True, margin=2, max_rects=32):
+        self.screen = pygame.Rect(0, 0, width, height)
+        self.enabled = enabled
+        self.margin = margin  # antialiasing and outlines can spill past the bounds
+        self.max_rects = max_rects  # beyond this one full redraw is cheaper
+        self.previous = []
+        self.current = []
+        self.full = True  # the next frame redraws the whole screen
+
+    def invalidate(self):
+        self.full = True
+
+    def mark(self, rect):
+        # a screen rect drawn this frame, returned clipped to the screen
+        rect = pygame.Rect(rect).inflate(2 * self.margin, 2 * self.margin).clip(self.screen)
+        if rect.width and rect.height:
+            self.current.append(rect)
+        return rect
+
+    def mark_box(self, box, offset):
+        # a world (min x, min y, max x, max y) box drawn at offset
+        x0, y0, x1, y1 = box
+        left, top = math.floor(x0 + offset[0]), math.floor(y0 + offset[1])
+        return self.mark((left, top, math.ceil(x1 + offset[0]) - left + 1, math.ceil(y1 + offset[1]) - top + 1))
+
+    def regions(self):
+        # the rects to clear, redraw and pass to pygame.display.update this frame
+        rects = merge(self.previous + self.current)
+        if self.full or not self.enabled or len(rects) > self.max_rects:
+            rects = [self.screen.copy()]
+        self.previous, self.current, self.full = self.current, [], False
+        return rects
+
+
+def merge(rects):
+    # join overlapping rects so no area is redrawn twice
+    rects = [rect.copy() for rect in rects]
+    i = 0
+    while i < len(rects):
+        # grow rects[i] until it touches none of the later rects
+        j = i + 1
+        while j < len(rects):
+            if rects[i].colliderect(rects[j]):
+                rects[i].union_ip(rects.pop(j))
+                j = i + 1
+            else:
+                j += 1
+        i += 1
+    return rects
@@ -0,0 +1,102 @@
+import argparse
+import hashlib
+import json
+import os
+from collections import defaultdict
+from time import perf_counter
+
+import numpy as np
+
+import levelcache
+import streaming
+
+# Input journals and replays.
+# The only input to the physics is laser shots, so a session is the level, the
+# settings the world was built with, the tick of every shot and its target. With a
+# seeded Simulation the same journal always steps to the same state, which the
+# journal checks against a checksum of the session's final state.
+#
+#   python replay.py replay.json        # replay headless as fast as possible and verify
+
+class Journal:
+    def __init__(self, level, rate=60, seed=0, sector_height=1000, reach=1, shots=(), ticks=None, checksum=None):
+        self.level = level
+        self.rate = rate
+        self.seed = seed
+        self.sector_height = sector_height  # level streaming, see streaming.LevelStream
+        self.reach = reach
+        self.shots = [(tick, tuple(target)) for tick, target in shots]  # (tick, world target)
+        self.ticks = ticks  # steps the session ran for
+        self.checksum = checksum  # of the state after the last step
+
+    def shoot(self, sim, target):
+        # fire a laser in sim and record it
+        self.shots.append((sim.tick, (float(target[0]), float(target[1]))))
+        return sim.shoot(target)
+
+    def finish(self, sim):
+        self.ticks = sim.tick
+        self.checksum = checksum(sim)
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump(vars(self), f)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls(**json.load(f))
+
+
+def start(journal, **kwargs):
+    # the world the journal was recorded in, as (simulation, level stream)
+    stream = streaming.LevelStream(levelcache.load_data(journal.level), journal.sector_height, journal.reach)
+    sim = stream.start(rate=journal.rate, seed=journal.seed, **kwargs)
+    return sim, stream
+
+def checksum(sim):
+    # hash of the tick, score and the state of every stored body
+    store = sim.bodies
+    slots = np.flatnonzero(store.active)
+    h = hashlib.sha1()
+    h.update(np.array([sim.tick, sim.bombs_used, sim.touch_goal], dtype=np.int64).tobytes())
+    h.update(slots.astype(np.int64).tobytes())
+    for name in ("pos", "vel", "angle", "avel"):
+        h.update(np.ascontiguousarray(getattr(store, name)[slots]).tobytes())
+    return h.hexdigest()
+
+def replay(journal, **kwargs):
+    # step a fresh world through journal as fast as possible; returns the simulation
+    sim, stream = start(journal, **kwargs)
+    script = defaultdict(list)
+    for tick, target in journal.shots:
+        script[tick].append(target)
+    dt = sim.stepper.dt
+    while True:
+        # shots fired after the last step still count, so fire before checking the end
+        for target in script.get(sim.tick, ()):
+            sim.shoot(target)
+        if sim.tick >= journal.ticks:
+            return sim
+        sim.step(dt)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay recorded sessions headless and verify them")
+    parser.add_argument("journals", nargs="+")
+    args = parser.parse_args(argv)
+    failed = 0
+    for path in args.journals:
+        journal = Journal.load(path)
+        start_time = perf_counter()
+        sim = replay(journal)
+        seconds = perf_counter() - start_time
+        ok = checksum(sim) == journal.checksum
+        failed += not ok
+        speed = sim.tick * sim.stepper.dt / seconds if seconds else 0
+        print(f"{path}: {'ok' if ok else 'MISMATCH'}, {sim.tick} steps, {len(journal.shots)} shots, "
+              f"{seconds:.2f} s, {speed:.0f}x real time")
+    return failed
+
+if __name__ == "__main__":
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    raise SystemExit(main())
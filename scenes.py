@@ -0,0 +1,66 @@
+import random
+from pygame.math import Vector2
+
+from level import Circle, Polygon
+import levelcache
+
+# Synthetic stress scenes for bench.py.
+# Each function returns a list of objects ready to hand to Simulation.
+
+def rectangle(width, height):
+    # local points of a width x height rectangle centered on its pos
+    w, h = width/2, height/2
+    return [Vector2(-w,-h), Vector2(w,-h), Vector2(w,h), Vector2(-w,h)]
+
+def box(width, height, thickness=20, color=(0,255,0)):
+    # four static slabs around the area (0, 0) to (width, height)
+    return [Polygon(pos=(width/2, height + thickness/2), local_points=rectangle(width + 2*thickness, thickness), color=color),
+            Polygon(pos=(width/2, -thickness/2), local_points=rectangle(width + 2*thickness, thickness), color=color),
+            Polygon(pos=(-thickness/2, height/2), local_points=rectangle(thickness, height), color=color),
+            Polygon(pos=(width + thickness/2, height/2), local_points=rectangle(thickness, height), color=color)]
+
+def circles_in_box(n=1000, radius=6, columns=40, seed=0):
+    # n circles dropped into a box on a jittered grid
+    random.seed(seed)
+    spacing = 2*radius + 4
+    rows = (n + columns - 1) // columns
+    width = columns * spacing + 40
+    height = rows * spacing + 400
+    objects = box(width, height)
+    for i in range(n):
+        x = 20 + spacing * (i % columns + 0.5) + random.uniform(-1, 1)
+        y = 20 + spacing * (i // columns + 0.5)
+        objects.append(Circle(pos=(x,y), radius=radius, mass=1, momi=0.5*radius**2, restitution=0.2, color=(255,255,255)))
+    return objects
+
+def polygon_stack(n=500, size=(20,10), columns=100, seed=0):
+    # n boxes stacked in columns resting on the floor. The default path keeps
+    # columns only a few boxes high (taller ones sink through the floor without the solver)
+    random.seed(seed)
+    w, h = size
+    spacing = w + 10
+    rows = (n + columns - 1) // columns
+    width = columns * spacing + 20
+    height = rows * h + 200
+    objects = box(width, height)
+    for i in range(n):
+        x = 10 + spacing * (i % columns + 0.5) + random.uniform(-1, 1)
+        y = height - h * (i // columns + 0.5)
+        objects.append(Polygon(pos=(x,y), local_points=rectangle(w, h), mass=1, momi=(w**2 + h**2)/12, restitution=0.2, color=(255,255,255)))
+    return objects
+
+def drop(size=(20,10), floor=400):
+    # one box dropped onto a static floor whose top is at y = floor
+    w, h = size
+    return [Polygon(pos=(200, floor + 10), local_points=rectangle(400, 20), color=(0,255,0)),
+            Polygon(pos=(200, floor - 100), local_points=rectangle(w, h), mass=1, momi=(w**2 + h**2)/12, restitution=0.2, color=(255,255,255))]
+
+def level_scene(filename="Level_Test.tmx"):
+    return levelcache.load(filename).objects
+
+scenes = {
+    "level": level_scene,
+    "circles": circles_in_box,
+    "stack": polygon_stack,
+    "drop": drop,
+}
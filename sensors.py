@@ -0,0 +1,83 @@
+import broadphase
+import contact
+
+# Trigger volumes.
+# Goals and other non resolving objects are registered as sensors in
+# their own spatial hash. Every update finds the sensors each tracked body might
+# touch and reports what changed since the last update as (kind, sensor, body)
+# events, kind being "enter", "stay" or "exit". Narrow phase tests are only run
+# when the answer can have changed: pairs whose bounds are apart aren't touching,
+# a sleeping body against a sensor that hasn't moved keeps its state, and so does a
+# touching pair whose broad phase fat boxes are the ones it was last tested with
+# (neither has moved more than the broad phase margin since).
+
+class Sensors:
+    def __init__(self, cell_size=100, generate=contact.generate):
+        self.grid = broadphase.SpatialHash(cell_size=cell_size)
+        self.generate = generate  # the narrow phase test, e.g. Simulation.generate to count tests
+        self.state = {}  # (sensor, body) -> touching, for pairs the broad phase found last update
+        self.boxes = {}  # (sensor, body) -> their fat boxes when the pair was last tested
+        self.moved = set()  # sensors added, moved or resized since the last update
+        self.pending = []  # exit events of removed sensors, reported by the next update
+
+    def __len__(self):
+        return len(self.grid)
+
+    def __contains__(self, sensor):
+        return sensor in self.grid
+
+    def add(self, sensor):
+        self.grid.insert(sensor)
+        self.moved.add(sensor)
+
+    def move(self, sensor):
+        # call after changing a sensor's position or size
+        self.grid.update(sensor)
+        self.moved.add(sensor)
+
+    def remove(self, sensor):
+        self.grid.remove(sensor)
+        self.moved.discard(sensor)
+        for key, touching in list(self.state.items()):
+            if key[0] is sensor:
+                del self.state[key]
+                if touching:
+                    self.pending.append(("exit", sensor, key[1]))
+
+    def update(self, bodies, bounds=None):
+        # events for bodies against every sensor since the last update.
+        # bounds maps bodies to their fat broad phase boxes, e.g. SpatialHash.bounds
+        if not self.grid and not self.pending:
+            return []
+        events, self.pending = self.pending, []
+        state = {}
+        boxes = {}
+        sensor_bounds = self.grid.bounds
+        for body in bodies:
+            box = body.aabb()
+            fat = bounds.get(body) if bounds is not None else None
+            for sensor in self.grid.query(box, exclude=body):
+                key = (sensor, body)
+                before = self.state.get(key)
+                fats = boxes[key] = (fat, sensor_bounds[sensor])
+                if not broadphase.overlaps(box, sensor.aabb()):
+                    touching = False
+                elif before is not None and body.sleeping and sensor not in self.moved:
+                    touching = before  # neither side moved
+                elif before and fat is not None and self.boxes.get(key) == fats and sensor not in self.moved:
+                    touching = True  # neither side moved past its margin since the test
+                else:
+                    touching = bool(self.generate(body, sensor, resolve=False))
+                state[key] = touching
+                if touching:
+                    events.append(("stay" if before else "enter", sensor, body))
+                elif before:
+                    events.append(("exit", sensor, body))
+        # pairs the broad phase no longer finds have separated
+        for key, touching in self.state.items():
+            if touching and key not in state:
+                events.append(("exit",) + key)
+        self.state = state
+        self.boxes = boxes
+        self.moved.clear()
+        return events
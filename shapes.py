@@ -0,0 +1,92 @@
+from collections import OrderedDict
+from pygame.math import Vector2
+
+# Shared shape definitions.
+# A PolygonShape holds everything about a polygon that doesn't depend on where it
+# is: local vertices, outward normals, convexity, area, centroid and moment of
+# inertia. polygon() returns the same shape for the same vertices, so identical
+# bodies (every 20x10 crate, every TMX rectangle of one size) work these out once
+# and share one copy. Shapes are shared: never modify their vertices or normals.
+# A shape also keeps its geometry rotated to the last few angles asked for, so
+# bodies that don't turn (every static one) share their rotated points and normals.
+
+max_shapes = 1024  # shapes kept for reuse; the least recently used go first
+max_rotations = 4  # rotations kept per shape
+cache = OrderedDict()  # vertices -> PolygonShape
+
+
+class PolygonShape:
+    __slots__ = ("points", "normals", "convex", "area", "centroid", "momi", "rotations")
+
+    def __init__(self, points, normals=None):
+        self.points = tuple(Vector2(point) for point in points)
+        if normals is None:
+            normals, self.convex = outward_normals(self.points)
+            if not self.convex:
+                print("WARNING! Non-convex polygon defined. Collisions will be inncorrect.")
+        else:
+            self.convex = True  # normals worked out before, e.g. by a level compiler
+        self.normals = tuple(Vector2(normal) for normal in normals)
+        self.area, self.centroid, self.momi = area_properties(self.points)
+        self.rotations = {}  # angle -> (points, normals), oldest first
+
+    def __len__(self):
+        return len(self.points)
+
+    def rotated(self, angle):
+        # the vertices and normals rotated by angle degrees, as tuples that are shared
+        found = self.rotations.get(angle)
+        if found is None:
+            found = (tuple(point.rotate(angle) for point in self.points),
+                     tuple(normal.rotate(angle) for normal in self.normals))
+            if len(self.rotations) >= max_rotations:
+                del self.rotations[next(iter(self.rotations))]
+            self.rotations[angle] = found
+        return found
+
+
+def outward_normals(points):
+    # edge normals flipped to point out of the polygon, and whether it is convex
+    n = len(points)
+    normals = [(points[i] - points[i-1]).normalize().rotate(90) for i in range(n)]
+    convex = True
+    if n > 2:
+        for i in range(n):
+            d = [(points[j%n] - points[i]).dot(normals[i]) for j in range(i+1, i+n-1)]
+            if max(d) <= 0:
+                pass
+            elif min(d) >= 0:
+                normals[i] = -normals[i]
+            else:
+                convex = False
+    return normals, convex
+
+def area_properties(points):
+    # area, centroid and second moment of area about the centroid (per unit density),
+    # summed over the triangles the origin makes with each edge
+    area = 0
+    moment = Vector2(0, 0)
+    second = 0
+    for i in range(len(points)):
+        s0, s1 = points[i], points[i-1]
+        tri_area = 0.5 * s0.cross(s1)
+        area += tri_area
+        moment += tri_area * (s0 + s1) / 3
+        second += tri_area / 6 * (s0 * s0 + s1 * s1 + s0 * s1)
+    if area == 0:
+        return 0, Vector2(0, 0), 0
+    centroid = moment / area
+    # the signs of area and second follow the winding, so abs() both
+    return abs(area), centroid, abs(second) - abs(area) * centroid.length_squared()
+
+def polygon(points, normals=None):
+    # the shared shape with these local vertices
+    key = tuple((float(point[0]), float(point[1])) for point in points)
+    shape = cache.get(key)
+    if shape is None:
+        shape = cache[key] = PolygonShape(key, normals)
+        if len(cache) > max_shapes:
+            cache.popitem(last=False)
+    else:
+        cache.move_to_end(key)
+    return shape
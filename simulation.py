@@ -0,0 +1,347 @@
+import math
+from pygame.math import Vector2
+
+import contact
+import narrowphase
+import broadphase
+import bvh
+import world
+import timestep
+from profiler import Profiler
+from solver import ContactManager
+from sleep import SleepManager
+from projectiles import Lazers, Explosions
+from sensors import Sensors
+
+# The game's physics without any window.
+# Gravity_box.py draws a Simulation; bench.py and other tools step one headless.
+
+class Simulation:
+    def __init__(self, objects, rate=120, substeps=1, gravity=(0,300), lazer_gravity=(0,480), profiler=None, solver_iterations=None, sleeping=True, static=None, seed=None):
+        self.objects = objects
+        self.profiler = profiler if profiler is not None else Profiler()
+        self.gravity = Vector2(gravity)  # for dynamic level objects other than the player
+        self.lazer_gravity = Vector2(lazer_gravity)  # lasers fall at 8 px/s every 1/60 s
+        self.lazer_speed = 300
+        self.explosion_force = 2800  # push on every body inside an explosion
+        self.explosion_falloff = 0  # the push scales by (1 - distance / radius) ** falloff
+        self.explosion_occlusion = False  # static geometry shields the bodies behind it
+        self.touch_goal = False
+        self.bombs_used = 0
+        self.tick = 0  # physics steps taken
+        self.contact_count = 0  # contacts generated that touched
+        self.stepper = timestep.FixedTimestep(rate=rate, substeps=substeps)
+        self.step_hooks = []  # functions of the simulation called after every step
+        if seed is not None:
+            contact.seed(seed)  # the only randomness in a step
+        # with solver_iterations, resolving contacts are collected and solved together
+        # with warm starting instead of being resolved one by one as they are generated
+        self.solver = ContactManager(iterations=solver_iterations) if solver_iterations else None
+
+        self.player = None
+        for o in objects:
+            if o.pinball_type == "player":
+                self.player = o
+
+        # static geometry never moves, so it goes in a bounding volume hierarchy built once
+        # (or loaded ready made with a compiled level)
+        if static is None:
+            static = bvh.BVH([o for o in objects if o.mass == math.inf])
+        self.static = static
+        # everything that moves keeps its state in one array backed store
+        self.bodies = world.BodyStore()
+        # broad phase grid for everything that moves, so contacts are only generated for overlapping bounds
+        self.grid = broadphase.SpatialHash(cell_size=100)
+        self.debris = []  # dynamic objects other than the player
+        # goals are trigger volumes; events holds the last step's
+        # (kind, sensor, body) enter/stay/exit events for the player and debris
+        self.sensors = Sensors(generate=self.generate)
+        self.events = []
+        for o in objects:
+            self.add_body(o)
+        # bodies that come to rest fall asleep and are skipped until something wakes them
+        self.sleep = SleepManager(self.bodies) if sleeping else None
+        # lasers and explosions are recycled; lazer and explosions are the live ones
+        self.lazer_pool = Lazers(self.bodies, gravity=self.lazer_gravity)
+        self.explosion_pool = Explosions()
+        self.lazer = self.lazer_pool.live
+        self.explosions = self.explosion_pool.live
+
+    def add_body(self, o):
+        # start simulating a dynamic object (static ones only need to be in self.static)
+        if o.pinball_type == "goal":
+            self.sensors.add(o)
+        if o.mass == math.inf:
+            return
+        if o is self.player:
+            self.bodies.add(o)
+        else:
+            self.bodies.add(o, gravity=self.gravity)
+            self.debris.append(o)
+        self.grid.insert(o)
+
+    def add_object(self, o):
+        # bring a level object into the simulation after construction.
+        # Static objects are only queried once self.static is rebuilt with them
+        self.objects.append(o)
+        self.add_body(o)
+
+    def remove_object(self, o):
+        # take a level object out; a dynamic one keeps its state on the object
+        self.objects.remove(o)
+        if o in self.sensors:
+            self.sensors.remove(o)
+        if o in self.bodies:
+            self.grid.remove(o)
+            self.bodies.remove(o)
+            if o in self.debris:
+                self.debris.remove(o)
+
+    def awake(self):
+        # the stored bodies that integrate and need contacts this step
+        return self.bodies.awake() if self.sleep is not None else list(self.bodies)
+
+    def body_pairs(self):
+        # broad phase pairs of moving bodies; two sleeping bodies never need a contact
+        if self.sleep is None:
+            return self.grid.pairs()
+        return self.grid.pairs(among=[o for o in self.awake() if o in self.grid])
+
+    def contacts(self, body, resolve_only=False, goal=None, exclude=None, dynamic=True):
+        # every contact of body with the static level, and the other bodies if dynamic,
+        # deepest first. Contacts are generated with resolve=False, see resolve(). resolve_only keeps
+        # objects with resolve set; goal=True keeps only goals and goal=False drops them
+        candidates = self.static.candidates(body)
+        if dynamic:
+            candidates += self.grid.candidates(body)
+        if resolve_only or goal is not None or exclude is not None:
+            candidates = [o for o in candidates if o is not exclude and (o.resolve or not resolve_only)
+                          and (goal is None or goal == (o.pinball_type == "goal"))]
+        found = []
+        for o in narrowphase.maybe_touching(body, candidates):
+            c = self.generate(body, o, resolve=False)
+            if c:
+                found.append(c)
+        found.sort(key=lambda c: c.overlap, reverse=True)
+        return found
+
+    def first_contact(self, body, **kwargs):
+        # the deepest contact of body, or None; takes the same filters as contacts()
+        found = self.contacts(body, **kwargs)
+        return found[0] if found else None
+
+    def touch(self, a, b, c):
+        # tell the sleep manager about a contact, waking a sleeper an awake body hit
+        if c and self.sleep is not None:
+            self.sleep.touch(a, b)
+        return c
+
+    def shoot(self, target):
+        # fire a laser from the player towards the world position target
+        self.bombs_used += 1
+        direction = Vector2(target) - self.player.pos
+        if direction.length() != 0:
+            direction = direction.normalize()
+        return self.lazer_pool.fire(self.player.pos, direction * self.lazer_speed)
+
+    def advance(self, frame_time):
+        # step as often as frame_time allows; returns the number of steps taken
+        return self.stepper.advance(frame_time, self.step)
+
+    def phases(self):
+        # the parts of one step, in order, as (name, function of dt)
+        if self.solver is not None:
+            return [("forces", self.apply_forces),
+                    ("explosions", self.update_explosions),
+                    ("sensors", self.update_sensors),
+                    ("collect_contacts", self.collect_contacts),
+                    ("integrate_velocities", self.integrate_velocities),
+                    ("solve", self.solve),
+                    ("integrate_positions", self.integrate_positions),
+                    ("lazer_contacts", self.lazer_contacts),
+                    ("sleep", self.update_sleep)]
+        return [("forces", self.apply_forces),
+                ("player_contacts", self.player_contacts),
+                ("explosions", self.update_explosions),
+                ("sensors", self.update_sensors),
+                ("integrate", self.integrate),
+                ("body_contacts", self.body_contacts),
+                ("lazer_contacts", self.lazer_contacts),
+                ("sleep", self.update_sleep)]
+
+    def step(self, dt):
+        # advance the simulation by exactly dt, timing every phase
+        scope = self.profiler.scope
+        for name, phase in self.phases():
+            with scope(name):
+                phase(dt)
+        self.tick += 1
+        with scope("step_hooks"):
+            for hook in self.step_hooks:
+                hook(self)
+
+    def generate(self, a, b, resolve, **kwargs):
+        # contact.generate, counting narrow phase tests and contacts
+        c = contact.generate(a, b, resolve=resolve, **kwargs)
+        if c:
+            self.contact_count += 1
+        if self.profiler.enabled:
+            self.profiler.count("narrow_phase")
+            if c:
+                self.profiler.count("contacts")
+                if resolve:
+                    self.profiler.count("resolved")
+        return c
+
+    def resolve(self, c, o, update=True):
+        # resolve a contact from contacts() against o, counting it if it applied an impulse.
+        # Resolving moves the body, so every contact after a body's first needs update
+        resolved = c.resolve(restitution=o.restitution, rebound=o.rebound, friction=0.5, update=update)
+        if resolved and self.profiler.enabled:
+            self.profiler.count("resolved")
+        return resolved
+
+    def apply_forces(self, dt):
+        self.bodies.save_state()
+        self.bodies.clear_forces()
+        if self.player is not None:
+            self.player.add_force((0,300))
+
+    def player_contacts(self, dt):
+        player = self.player
+        if player is None:
+            return
+        # goals are sensors, see update_sensors
+        for i, c in enumerate(self.contacts(player, goal=False)):
+            o = other(c, player)
+            self.touch(player, o, self.resolve(c, o, update=i > 0))
+
+    def update_explosions(self, dt):
+        # grow the explosions, then push everything each one reaches: one radius query
+        # in the grid and one vectorized pass over the store per explosion
+        self.explosion_pool.update(dt)
+        for e in self.explosions:
+            reached = self.grid.within(e.pos, e.radius)
+            if self.explosion_occlusion:
+                reached = [o for o in reached if not self.occluded(e.pos, o.pos)]
+            if reached:
+                pushed = self.bodies.push_radial([o._slot for o in reached], e.pos, e.radius,
+                                                 self.explosion_force, self.explosion_falloff)
+                if self.profiler.enabled:
+                    self.profiler.count("pushed", pushed)
+
+    def occluded(self, a, b):
+        # whether static geometry blocks the line from a to b
+        hit, t = self.static.raycast(a, Vector2(b) - a, Vector2(b).distance_to(a))
+        return hit is not None
+
+    def update_sensors(self, dt):
+        # goals act on the player through enter/stay events
+        player = self.player
+        bodies = self.debris if player is None else [player] + self.debris
+        self.events = self.sensors.update(bodies, self.grid.bounds)
+        for kind, sensor, body in self.events:
+            if kind != "exit" and sensor.pinball_type == "goal" and body is player:
+                self.touch_goal = True
+
+    def integrate(self, dt):
+        # integrate the player, debris and every laser in one pass
+        self.bodies.integrate(dt)
+        for o in self.awake():
+            if o in self.grid:
+                self.grid.update(o)
+
+    def collect_contacts(self, dt):
+        # every resolving contact of the player and debris goes to the solver
+        player = self.player
+        solver = self.solver
+        if player is not None:
+            for c in self.contacts(player, goal=False):
+                o = other(c, player)
+                solver.add(self.touch(player, o, c), restitution=o.restitution, friction=0.5)
+        for a, b in self.body_pairs():
+            c = self.touch(a, b, self.generate(a, b, resolve=False))
+            if a is player or b is player:
+                partner = b if a is player else a
+                solver.add(c, restitution=partner.restitution, friction=0.5)
+            else:
+                solver.add(c, restitution=min(a.restitution, b.restitution), friction=0.5)
+        for body in self.debris:
+            if body.sleeping:
+                continue
+            for c in self.contacts(body, resolve_only=True, dynamic=False):
+                solver.add(c, restitution=other(c, body).restitution, friction=0.5)
+
+    def integrate_velocities(self, dt):
+        self.bodies.integrate_velocities(dt)
+
+    def solve(self, dt):
+        solved = self.solver.solve()
+        if self.profiler.enabled:
+            self.profiler.count("resolved", solved)
+
+    def integrate_positions(self, dt):
+        self.bodies.integrate_positions(dt)
+        for o in self.awake():
+            if o in self.grid:
+                self.grid.update(o)
+
+    def body_contacts(self, dt):
+        # debris against each other, the player and the static level
+        for a, b in self.body_pairs():
+            if a is self.player or b is self.player:
+                partner = b if a is self.player else a
+                c = self.generate(a, b, resolve=True, restitution=partner.restitution, rebound=partner.rebound, friction=0.5)
+            else:
+                c = self.generate(a, b, resolve=True, restitution=min(a.restitution, b.restitution), rebound=0, friction=0.5)
+            self.touch(a, b, c)
+        for body in self.debris:
+            if body.sleeping:
+                continue
+            for i, c in enumerate(self.contacts(body, resolve_only=True, dynamic=False)):
+                self.resolve(c, other(c, body), update=i > 0)
+
+    def lazer_contacts(self, dt):
+        hits = []
+        for lazers in self.lazer:
+            if self.sweep(lazers):
+                hits.append(lazers)
+                continue
+            for i, c in enumerate(self.contacts(lazers, exclude=self.player)):
+                o = other(c, lazers)
+                if not o.resolve or self.resolve(c, o, update=i > 0):
+                    self.touch(lazers, o, c)
+                    hits.append(lazers)
+                    break
+        # a laser that hit something turns into an explosion where it is
+        for lazers in hits:
+            self.explosion_pool.spawn(lazers.pos)
+            self.lazer_pool.release(lazers)
+
+    def sweep(self, lazers):
+        # continuous detection against the static level: a laser whose path this step
+        # crossed static geometry is moved back to where it first touched, and has hit.
+        # Overlap tests at the end of the step alone let fast lasers skip thin walls
+        start = lazers.prev_pos
+        travel = lazers.pos - start
+        distance = travel.length()
+        if distance <= lazers.radius:
+            return False  # too slow to pass through anything the overlap test would miss
+        hit, t = self.static.raycast(start, travel, distance, radius=lazers.radius)
+        if hit is None:
+            return False
+        lazers.pos = start + travel.normalize() * t
+        self.profiler.count("swept")
+        return True
+
+    def update_sleep(self, dt):
+        if self.sleep is None:
+            return
+        self.sleep.update(dt)
+        if self.profiler.enabled:
+            self.profiler.count("awake", int(self.bodies.moving().sum()))
+
+
+def other(c, body):
+    # the object body is touching in contact c
+    return c.b if c.a is body else c.a
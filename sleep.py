@@ -0,0 +1,62 @@
+import numpy as np
+
+# Sleeping bodies.
+# A body that stays nearly still for time_to_sleep seconds is ready to sleep,
+# and once every body of its island (bodies connected through contacts) is ready
+# the whole island is put to sleep. Sleeping bodies are skipped by integration,
+# the broad phase and contact resolution until something pushes them
+# (BodyView.add_force / impulse) or an awake body touches them.
+
+class SleepManager:
+    def __init__(self, store, linear=5, angular=10, time_to_sleep=0.5):
+        self.store = store
+        self.linear = linear  # px/s
+        self.angular = angular  # degrees/s
+        self.time_to_sleep = time_to_sleep
+        self.edges = []  # (slot, slot) contacts between stored bodies this step
+
+    def touch(self, a, b):
+        # record a contact; bodies touching an awake body wake up
+        if a.sleeping and not b.sleeping and b.mass != float("inf"):
+            a.wake()
+        if b.sleeping and not a.sleeping and a.mass != float("inf"):
+            b.wake()
+        if a in self.store and b in self.store:
+            self.edges.append((a._slot, b._slot))
+
+    def update(self, dt):
+        store = self.store
+        moving = store.moving()
+        speed = np.hypot(store.vel[:, 0], store.vel[:, 1])
+        still = moving & (speed < self.linear) & (np.abs(store.avel) < self.angular)
+        store.sleep_time[still] += dt
+        store.sleep_time[moving & ~still] = 0
+        ready = moving & (store.sleep_time >= self.time_to_sleep)
+        edges, self.edges = self.edges, []
+        if not ready.any():
+            return 0
+
+        # union find over this step's contacts gives the islands
+        parent = {}
+        def find(slot):
+            root = slot
+            while parent.get(root, root) != root:
+                root = parent[root]
+            while slot != root:
+                parent[slot], slot = root, parent.get(slot, slot)
+            return root
+        for a, b in edges:
+            ra, rb = find(a), find(b)
+            if ra != rb:
+                parent[ra] = rb
+
+        # an island sleeps only if every awake body in it is ready
+        blocked = set()
+        for slot in np.flatnonzero(moving & ~ready):
+            blocked.add(find(slot))
+        slept = 0
+        for slot in np.flatnonzero(ready):
+            if find(slot) not in blocked:
+                store.sleep(slot)
+                slept += 1
+        return slept
@@ -0,0 +1,187 @@
+import math
+from pygame.math import Vector2
+
+# Sequential impulse contact solver with persistent manifolds.
+# Instead of resolving every contact as soon as it is generated, a step's contacts
+# are collected by body pair, then solved together over several iterations.
+# The impulses found for each contact point are kept and applied up front (warm
+# starting) the next step the pair is still touching, so resting stacks settle quickly.
+
+class ContactPoint:
+    def __init__(self, point, overlap, feature):
+        self.point = point
+        self.overlap = overlap
+        self.feature = feature  # which vertex made the point, to match it next step
+        self.jn = 0  # accumulated normal impulse
+        self.jt = 0  # accumulated friction impulse
+
+
+class Manifold:
+    def __init__(self, a, b):
+        self.a = a
+        self.b = b
+        self.normal = None
+        self.points = []
+        self.age = 0  # steps this pair has been touching
+
+    def set(self, c, restitution, friction):
+        # take the geometry of a fresh contact c, keeping impulses of matching points
+        normal = Vector2(c.normal)
+        old = {}
+        if self.normal is not None and self.normal.dot(normal) > 0.9:
+            old = {p.feature: p for p in self.points}
+        self.normal = normal
+        self.points = []
+        for point, overlap, feature in contact_points(c):
+            p = ContactPoint(point, overlap, feature)
+            if feature in old:
+                p.jn, p.jt = old[feature].jn, old[feature].jt
+            self.points.append(p)
+        self.overlap = c.overlap
+        self.restitution = restitution
+        self.friction = friction
+
+
+def contact_points(c):
+    # the points of contact c as (point, overlap, feature).
+    # Polygon_Polygon only reports its deepest vertex; a resting box needs two
+    # points, so the edge of that polygon facing the hit face is clipped to the
+    # face and both ends are used.
+    deepest = [(Vector2(c.point()), c.overlap, None)]
+    if c.a.contact_type != "Polygon" or c.b.contact_type != "Polygon":
+        return deepest
+    polygon = c.polygon
+    owner = c.b if polygon is c.a else c.a  # the polygon whose face was hit
+    face_normal = c.normal if polygon is c.a else -c.normal
+    j = max(range(len(owner.normals)), key=lambda i: owner.normals[i].dot(face_normal))
+    k = min(range(len(polygon.normals)), key=lambda i: polygon.normals[i].dot(face_normal))
+    start, end = owner.points[j-1], owner.points[j]
+    tangent = end - start
+    length = tangent.length_squared()
+    if not length:
+        return deepest
+    p0, p1 = polygon.points[k-1], polygon.points[k]
+    u0 = (p0 - start).dot(tangent) / length
+    u1 = (p1 - start).dot(tangent) / length
+    points = []
+    for feature, (p, u, q, v) in enumerate([(p0, u0, p1, u1), (p1, u1, p0, u0)]):
+        # slide each end of the edge back over the face if it hangs off
+        if u < 0 < v:
+            p, u = p + (q - p) * (-u / (v - u)), 0
+        elif v < 1 < u:
+            p, u = p + (q - p) * ((1 - u) / (v - u)), 1
+        if 0 <= u <= 1:
+            overlap = (start - p).dot(face_normal)
+            if overlap > 0:
+                points.append((Vector2(p), overlap, (k, feature)))
+    return points or deepest
+
+
+class ContactManager:
+    def __init__(self, iterations=8, warm_start=True, correction=0.8, slop=0.5):
+        self.iterations = iterations
+        self.warm_start = warm_start
+        self.correction = correction  # fraction of the overlap removed each step
+        self.slop = slop  # overlap left in place so resting contacts persist between steps
+        self.manifolds = {}  # (a, b) -> Manifold, from the last step
+        self.current = {}  # manifolds touched this step
+
+    def __len__(self):
+        return len(self.manifolds)
+
+    def add(self, c, restitution=0, friction=0):
+        # collect a contact from contact.generate(..., resolve=False)
+        if not c:
+            return None
+        key = (c.a, c.b)
+        manifold = self.current.get(key)
+        if manifold is None:
+            manifold = self.manifolds.get(key)
+            if manifold is None:
+                manifold = Manifold(c.a, c.b)
+            else:
+                manifold.age += 1
+            self.current[key] = manifold
+        manifold.set(c, restitution, friction)
+        return manifold
+
+    def solve(self):
+        # resolve every collected contact, then keep them for warm starting next step
+        manifolds = list(self.current.values())
+        for m in manifolds:
+            self.prepare(m)
+        for m in manifolds:
+            self.correct_position(m)
+        for m in manifolds:
+            for p in m.points:
+                if self.warm_start:
+                    apply(m, p, p.jn * m.normal + p.jt * m.tangent)
+                else:
+                    p.jn = p.jt = 0
+        for i in range(self.iterations):
+            for m in manifolds:
+                for p in m.points:
+                    self.solve_point(m, p)
+        self.manifolds = self.current
+        self.current = {}
+        return len(manifolds)
+
+    def prepare(self, m):
+        a, b = m.a, m.b
+        m.tangent = m.normal.rotate(90)
+        for p in m.points:
+            p.sa = p.point - a.pos
+            p.sb = p.point - b.pos
+            p.normal_mass = inverse(effective_mass(a, b, p.sa, p.sb, m.normal))
+            p.tangent_mass = inverse(effective_mass(a, b, p.sa, p.sb, m.tangent))
+            # bounce: aim for the approach speed times restitution
+            vn = relative_velocity(m, p).dot(m.normal)
+            p.target = -m.restitution * vn if vn < 0 else 0
+
+    def correct_position(self, m):
+        # push the bodies apart along the normal, split by mass as in Contact.resolve
+        overlap = max(0, m.overlap - self.slop) * self.correction
+        if not overlap:
+            return
+        a, b = m.a, m.b
+        shift = inverse(1/a.mass + 1/b.mass) * overlap * m.normal
+        if a.mass != math.inf:
+            a.pos += shift / a.mass
+        if b.mass != math.inf:
+            b.pos -= shift / b.mass
+
+    def solve_point(self, m, p):
+        # normal impulse, the accumulated impulse never pulls the bodies together
+        v = relative_velocity(m, p)
+        dj = p.normal_mass * (p.target - v.dot(m.normal))
+        jn = max(p.jn + dj, 0)
+        dj, p.jn = jn - p.jn, jn
+        if dj:
+            apply(m, p, dj * m.normal)
+            v = relative_velocity(m, p)
+        # friction impulse, limited by the normal impulse
+        djt = -p.tangent_mass * v.dot(m.tangent)
+        limit = m.friction * p.jn
+        jt = max(-limit, min(limit, p.jt + djt))
+        djt, p.jt = jt - p.jt, jt
+        if djt:
+            apply(m, p, djt * m.tangent)
+
+
+def inverse(k):
+    # two infinite masses can't be pushed at all
+    return 1 / k if k else 0
+
+def effective_mass(a, b, sa, sb, direction):
+    return (1/a.mass + 1/b.mass
+            + sa.cross(direction)**2 / a.momi + sb.cross(direction)**2 / b.momi)
+
+def relative_velocity(m, p):
+    a, b = m.a, m.b
+    vpa = a.vel + math.radians(a.avel) * p.sa.rotate(90)
+    vpb = b.vel + math.radians(b.avel) * p.sb.rotate(90)
+    return vpa - vpb
+
+def apply(m, p, impulse):
+    m.a.impulse(impulse, p.point)
+    m.b.impulse(-impulse, p.point)
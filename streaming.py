@@ -0,0 +1,81 @@
+import math
+from collections import defaultdict
+
+import bvh
+from simulation import Simulation
+
+# Streaming a tall level in vertical sectors.
+# Only the sectors within reach of the player are in the simulation. Static
+# geometry is built from the compiled level data (levelcache.LevelData) when its
+# sectors come into reach and dropped when they leave; dynamic bodies that leave
+# are taken out with their state and parked in the sector they are in, to carry on
+# where they were once the player comes back. Memory and per step work then depend
+# on the neighbourhood of the player, not on the height of the level.
+
+class LevelStream:
+    def __init__(self, data, sector_height=1000, reach=1):
+        self.data = data
+        self.sector_height = sector_height
+        self.reach = reach  # sectors kept loaded above and below the player's
+        self.static = defaultdict(list)  # sector -> every static record overlapping it
+        self.parked = defaultdict(list)  # sector -> dynamic bodies (or records not built yet) waiting there
+        self.loaded = {}  # record -> static object in the simulation
+        self.window = None  # (first, last) sectors loaded
+        self.version = 0  # counts changes to the static level, for anything caching it
+        self.player = None
+        for i in range(len(data)):
+            if data.properties(i)["pinball_type"] == "player":
+                self.player = i
+            elif data.static(i):
+                x0, y0, x1, y1 = data.bounds(i)
+                for sector in range(self.sector(y0), self.sector(y1) + 1):
+                    self.static[sector].append(i)
+            else:
+                x0, y0, x1, y1 = data.bounds(i)
+                self.parked[self.sector((y0 + y1) / 2)].append(i)
+
+    def sector(self, y):
+        return math.floor(y / self.sector_height)
+
+    def start(self, **kwargs):
+        # a Simulation of the player and the sectors around it; kwargs go to Simulation.
+        # Sectors are updated after every step, so streaming doesn't depend on frame times
+        objects = [self.data.build(self.player)] if self.player is not None else []
+        sim = Simulation(objects, static=bvh.BVH([]), **kwargs)
+        self.update(sim)
+        sim.step_hooks.append(self.update)
+        return sim
+
+    def update(self, sim):
+        # load and unload sectors around the player; returns True if the static level changed
+        if sim.player is None:
+            return False
+        centre = self.sector(sim.player.pos.y)
+        first, last = centre - self.reach, centre + self.reach
+
+        # dynamic bodies that left the loaded sectors wait where they are
+        for o in list(sim.debris):
+            home = self.sector(o.pos.y)
+            if not first <= home <= last:
+                sim.remove_object(o)
+                self.parked[home].append(o)
+        if (first, last) == self.window:
+            return False
+        self.window = (first, last)
+        for sector in range(first, last + 1):
+            for o in self.parked.pop(sector, ()):
+                sim.add_object(self.data.build(o) if isinstance(o, int) else o)
+
+        # static geometry reaches one sector further, so bodies near the edge
+        # never fall through a platform that isn't loaded yet
+        wanted = set()
+        for sector in range(first - 1, last + 2):
+            wanted.update(self.static.get(sector, ()))
+        for i in set(self.loaded) - wanted:
+            sim.remove_object(self.loaded.pop(i))
+        for i in sorted(wanted - set(self.loaded)):
+            self.loaded[i] = self.data.build(i)
+            sim.add_object(self.loaded[i])
+        sim.static = bvh.BVH([self.loaded[i] for i in sorted(self.loaded)])
+        self.version += 1
+        return True
@@ -0,0 +1,29 @@
+# Fixed timestep stepping.
+# Physics always advances in steps of exactly dt, however long a rendered frame took;
+# leftover time carries over in the accumulator and is used to interpolate the drawing.
+
+class FixedTimestep:
+    def __init__(self, rate=120, substeps=1, max_frame_time=0.25):
+        self.rate = rate
+        self.dt = 1 / rate
+        self.substeps = substeps
+        self.max_frame_time = max_frame_time  # clamp long frames so we never spiral behind
+        self.accumulator = 0
+        self.steps = 0  # total steps taken
+
+    @property
+    def alpha(self):
+        # how far the render time is between the previous step and the current one
+        return self.accumulator / self.dt
+
+    def advance(self, frame_time, step):
+        # call step(dt) as often as the elapsed frame_time allows; returns the number of steps
+        self.accumulator += min(frame_time, self.max_frame_time)
+        steps = 0
+        while self.accumulator >= self.dt:
+            for i in range(self.substeps):
+                step(self.dt / self.substeps)
+            self.accumulator -= self.dt
+            steps += 1
+        self.steps += steps
+        return steps
@@ -0,0 +1,232 @@
+import math
+from contextlib import contextmanager
+import numpy as np
+from pygame.math import Vector2
+
+# Structure of arrays storage for body state.
+# A body added to a BodyStore keeps its class and methods, but its pos, vel, force,
+# mass, momi, angle, avel and torque live in one slot of contiguous numpy arrays,
+# so force clearing and integration are one vectorized pass over every body.
+
+vector_fields = ("pos", "vel", "force")
+scalar_fields = ("mass", "momi", "angle", "avel", "torque")
+# every array in the store and the value new slots start with
+arrays = {
+    "pos": (2, 0), "vel": (2, 0), "force": (2, 0), "gravity": (2, 0),
+    "prev_pos": (2, 0), "prev_angle": (None, 0),  # state before the last step, for interpolation
+    "mass": (None, 1), "inv_mass": (None, 1), "momi": (None, math.inf), "inv_momi": (None, 0),
+    "angle": (None, 0), "avel": (None, 0), "torque": (None, 0),
+    "sleep_time": (None, 0),  # how long the body has been nearly still
+}
+
+def vector_property(name):
+    def get(self):
+        row = getattr(self._store, name)[self._slot]
+        return Vector2(row[0], row[1])
+    def set(self, value):
+        getattr(self._store, name)[self._slot] = (value[0], value[1])
+    return property(get, set)
+
+def scalar_property(name):
+    def get(self):
+        return float(getattr(self._store, name)[self._slot])
+    def set(self, value):
+        getattr(self._store, name)[self._slot] = value
+    return property(get, set)
+
+def inverse_property(name, inverse):
+    # mass and momi also keep their inverse up to date (infinite mass -> 0)
+    def get(self):
+        return float(getattr(self._store, name)[self._slot])
+    def set(self, value):
+        getattr(self._store, name)[self._slot] = value
+        getattr(self._store, inverse)[self._slot] = 1 / value if value != 0 else math.inf
+    return property(get, set)
+
+
+class BodyView:
+    # mixed in front of a body's own class while it is stored. It adds no slots, so
+    # the view class has the same layout and __class__ can be swapped both ways
+    __slots__ = ()
+    pos = vector_property("pos")
+    vel = vector_property("vel")
+    force = vector_property("force")
+    mass = inverse_property("mass", "inv_mass")
+    momi = inverse_property("momi", "inv_momi")
+    angle = scalar_property("angle")
+    avel = scalar_property("avel")
+    torque = scalar_property("torque")
+    prev_pos = vector_property("prev_pos")  # where the body was before the last step
+
+    @property
+    def sleeping(self):
+        return bool(self._store.asleep[self._slot])
+
+    def wake(self):
+        self._store.wake(self._slot)
+
+    def clear_force(self):
+        self._store.force[self._slot] = 0
+        self._store.torque[self._slot] = 0
+
+    # pushing a sleeping body wakes it up
+    def add_force(self, force):
+        self._store.wake(self._slot)
+        super().add_force(force)
+
+    def impulse(self, impulse, point=None):
+        self._store.wake(self._slot)
+        super().impulse(impulse, point)
+
+
+view_classes = {}
+
+def view_class(cls):
+    if cls not in view_classes:
+        view_classes[cls] = type(cls.__name__, (BodyView, cls), {"_base_class": cls, "__slots__": ()})
+    return view_classes[cls]
+
+
+class BodyStore:
+    def __init__(self, capacity=64):
+        self.capacity = 0
+        self.bodies = []  # slot -> body, None for free slots
+        self.free = []  # free slots, reused before growing
+        for name, (columns, fill) in arrays.items():
+            setattr(self, name, np.full((0, 2) if columns else 0, fill, dtype=float))
+        self.active = np.zeros(0, dtype=bool)  # slot holds a body
+        self.asleep = np.zeros(0, dtype=bool)  # body is resting and skipped by integrate
+        self.grow(capacity)
+
+    def __len__(self):
+        return len(self.bodies) - len(self.free)
+
+    def __iter__(self):
+        return (body for body in self.bodies if body is not None)
+
+    def __contains__(self, body):
+        return getattr(body, "_store", None) is self
+
+    def grow(self, capacity):
+        extra = capacity - self.capacity
+        if extra <= 0:
+            return
+        for name, (columns, fill) in arrays.items():
+            new = np.full((extra, 2) if columns else extra, fill, dtype=float)
+            setattr(self, name, np.concatenate([getattr(self, name), new]))
+        self.active = np.concatenate([self.active, np.zeros(extra, dtype=bool)])
+        self.asleep = np.concatenate([self.asleep, np.zeros(extra, dtype=bool)])
+        self.capacity = capacity
+
+    def add(self, body, gravity=(0,0)):
+        # move body's state into a slot and turn body into a view of that slot.
+        # gravity is an acceleration applied to the body on every integrate()
+        if body in self:
+            return body
+        if self.free:
+            slot = self.free.pop()
+        else:
+            slot = len(self.bodies)
+            self.bodies.append(None)
+            if slot >= self.capacity:
+                self.grow(max(2 * self.capacity, 64))
+        state = {name: getattr(body, name) for name in vector_fields + scalar_fields}
+        for name in state:
+            delattr(body, name)  # the store holds the state from now on
+        body._store = self
+        body._slot = slot
+        body.__class__ = view_class(type(body))
+        for name, value in state.items():
+            setattr(body, name, value)
+        self.prev_pos[slot] = self.pos[slot]
+        self.prev_angle[slot] = self.angle[slot]
+        self.gravity[slot] = gravity
+        self.sleep_time[slot] = 0
+        self.bodies[slot] = body
+        self.active[slot] = True
+        self.asleep[slot] = False
+        return body
+
+    def remove(self, body):
+        # copy the slot back onto body and make it a plain object again
+        if body not in self:
+            return
+        slot = body._slot
+        state = {name: getattr(body, name) for name in vector_fields + scalar_fields}
+        body.__class__ = body._base_class
+        del body._store, body._slot
+        for name, value in state.items():
+            setattr(body, name, value)
+        self.bodies[slot] = None
+        self.active[slot] = False
+        self.asleep[slot] = False
+        self.free.append(slot)
+
+    def clear_forces(self):
+        self.force[:] = 0
+        self.torque[:] = 0
+
+    def integrate(self, dt):
+        # the same steps as PhysicsObject.update, for every stored body at once
+        self.integrate_velocities(dt)
+        self.integrate_positions(dt)
+
+    def moving(self):
+        # mask of the slots integrate() works on
+        return self.active & ~self.asleep
+
+    def awake(self):
+        # bodies that are not asleep
+        return [self.bodies[slot] for slot in np.flatnonzero(self.moving())]
+
+    def wake(self, slot):
+        self.asleep[slot] = False
+        self.sleep_time[slot] = 0
+
+    def sleep(self, slot):
+        self.asleep[slot] = True
+        self.vel[slot] = 0
+        self.avel[slot] = 0
+
+    def integrate_velocities(self, dt):
+        # the velocity half of integrate, so a contact solver can run in between
+        active = self.moving()
+        self.vel[active] += (self.force[active] / self.mass[active, None] + self.gravity[active]) * dt
+        self.avel[active] += self.torque[active] / self.momi[active] * dt
+
+    def integrate_positions(self, dt):
+        active = self.moving()
+        self.pos[active] += self.vel[active] * dt
+        self.angle[active] += self.avel[active] * dt
+
+    def push_radial(self, slots, center, radius, strength, falloff=0):
+        # add a force pointing away from center to every slot in one pass, scaled by
+        # (1 - distance / radius) ** falloff; falloff=0 pushes equally out to the radius.
+        # Pushed sleepers wake up, a body exactly at center isn't pushed
+        slots = np.asarray(slots, dtype=int)
+        away = self.pos[slots] - (center[0], center[1])
+        distance = np.hypot(away[:, 0], away[:, 1])
+        scale = strength * np.clip(1 - distance / radius, 0, 1) ** falloff
+        pushed = distance > 0
+        slots, away, distance, scale = slots[pushed], away[pushed], distance[pushed], scale[pushed]
+        self.force[slots] += away * (scale / distance)[:, None]
+        self.asleep[slots] = False
+        self.sleep_time[slots] = 0
+        return len(slots)
+
+    def save_state(self):
+        # remember the current pose so rendering can interpolate towards the next step
+        self.prev_pos[:] = self.pos
+        self.prev_angle[:] = self.angle
+
+    @contextmanager
+    def interpolated(self, alpha):
+        # inside the with block every stored body reports a pose blended between the
+        # last two steps (alpha = 0 is the previous step, 1 the current one)
+        pos, angle = self.pos, self.angle
+        self.pos = self.prev_pos + (pos - self.prev_pos) * alpha
+        self.angle = self.prev_angle + (angle - self.prev_angle) * alpha
+        try:
+            yield
+        finally:
+            self.pos, self.angle = pos, angle